@@ -0,0 +1,69 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+LLM_DIR = os.path.dirname(os.path.abspath(__file__))
+MAIN_SCRIPT = os.path.join(LLM_DIR, "main.py")
+
+# --- Configuration ---
+# 1. The CLI invocations to time. None of them should import the ML libraries.
+COMMANDS = [
+    ["--help"],
+    ["train", "--help"],
+    ["config"],
+    ["generate", "--dry-run"],
+    ["build", "--dry-run"],
+    ["train", "--dry-run"],
+    ["merge", "--dry-run"],
+    ["serve", "--dry-run"],
+]
+
+# 2. What every script used to pay at startup before the imports were made
+#    lazy, for comparison. Skipped if the libraries are not installed.
+BASELINE_IMPORTS = "import torch, transformers, peft, trl"
+
+# 3. The startup budget each command has to meet.
+TARGET_S = 1.0
+
+
+def time_command(args, repeats):
+    """Runs a command `repeats` times. Returns (wall-clock seconds per run, last exit code)."""
+    timings = []
+    returncode = 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = subprocess.run(args, cwd=LLM_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+        returncode = result.returncode
+    return timings, returncode
+
+
+# --- Main Script Logic ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time how long the pipeline CLI takes to start.")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = []
+    for command in COMMANDS:
+        timings, returncode = time_command([sys.executable, MAIN_SCRIPT, *command], args.repeats)
+        rows.append(("main.py " + " ".join(command), timings, returncode))
+    baseline_timings, returncode = time_command([sys.executable, "-c", BASELINE_IMPORTS], args.repeats)
+    if returncode == 0:
+        rows.append((f"baseline: {BASELINE_IMPORTS}", baseline_timings, returncode))
+    else:
+        print("Note: torch/transformers/peft/trl are not installed, skipping the baseline.")
+
+    print(f"\n{'Command':<48}{'Min':>9}{'Median':>9}  Status")
+    for label, timings, returncode in rows:
+        median = statistics.median(timings)
+        if label.startswith("baseline"):
+            status = "-"
+        elif returncode != 0:
+            status = f"exit code {returncode}"
+        else:
+            status = "ok" if median < TARGET_S else f"over {TARGET_S:.1f}s"
+        print(f"{label:<48}{min(timings):>8.3f}s{median:>8.3f}s  {status}")
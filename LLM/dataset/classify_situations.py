@@ -0,0 +1,273 @@
+import json
+import re
+from collections import Counter
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import StratifiedKFold, cross_val_predict
+
+from create_training_dataset import consolidate_question_files
+
+# --- Configuration ---
+# 1. The numbered list of situations produced from situations_prompt.txt.
+SITUATIONS_FILE = "situations.txt"
+
+# 2. The question files whose questions should also be labelled.
+QUESTION_FILES = [
+    "gpt-oss_questions.txt",
+    "llama3.1_questions.txt",
+]
+
+# 3. The output file read by create_training_dataset.py for stratified sampling.
+OUTPUT_JSONL_FILE = "situation_categories.jsonl"
+
+# 4. The categories from situations_prompt.txt, each with a seed vocabulary.
+#    Situations that hit the vocabulary of exactly one category become the
+#    (weakly labelled) training set for the TF-IDF + logistic regression model,
+#    which then labels everything, including situations no keyword matched.
+CATEGORY_KEYWORDS = {
+    "medical": [
+        "bleeding", "bleeds", "wound", "laceration", "burn", "burns", "fracture", "fractures",
+        "broken", "choking", "heart attack", "stroke", "seizure", "unconscious", "breathing",
+        "allergic", "anaphylaxis", "poisoning", "poisoned", "bitten", "bite", "sting", "fever",
+        "infection", "diabetic", "diabetes", "insulin", "overdose", "cpr", "hypothermia",
+        "heatstroke", "dehydration", "pregnant", "labor", "injury", "injured", "sprain",
+        "concussion", "symptoms", "medication", "patient", "collapses", "pain", "sickness",
+        "vomiting", "disease", "surgery", "medic", "medics", "clinic", "hospital",
+        "burned", "scalded", "chokes", "suffocates", "suffocating", "electrocuted", "inhales",
+        "impaled", "crushed", "pinned under", "bleeds out", "cardiac arrest",
+    ],
+    "survival": [
+        "lost", "wilderness", "woods", "forest", "desert", "mountain", "hiker", "hiking",
+        "camping", "campsite", "stranded", "shelter", "bear", "snake", "shark", "avalanche",
+        "blizzard", "storm", "flood", "tsunami", "earthquake", "wildfire", "tornado",
+        "hurricane", "overboard", "raft", "island", "jungle", "trail", "purify", "foraging",
+        "survive", "survival", "dust storm", "lightning", "cave", "backpacker", "sailor",
+    ],
+    # Generic words ("car", "system", "fails", "tool") are left out on purpose:
+    # they appear in many medical and survival situations and would pull those
+    # into this category.
+    "technical": [
+        "engine", "generator", "car battery", "flat tire", "car breaks down", "breaks down",
+        "broken down", "won't start", "malfunction", "malfunctions", "short circuit", "circuit breaker",
+        "wiring", "electrical fault", "water pump", "chainsaw", "power tool", "bicycle chain",
+        "hydraulic", "hydraulics", "software", "computer", "radio", "solar panel", "satellite phone",
+        "forklift", "machinery", "troubleshoot", "troubleshooting", "repair it",
+    ],
+    "domestic": [
+        "house", "home", "kitchen", "pipe", "plumbing", "toilet", "leak", "leaking", "roof",
+        "power outage", "blackout", "blackouts", "food", "refrigerator", "freezer", "cooking",
+        "preserve", "preservation", "mold", "pest", "laundry", "heating", "furnace", "water heater",
+        "chimney", "appliance", "garden", "stove", "fryer", "budget", "cleaning",
+    ],
+    "psychological": [
+        "panic", "anxiety", "anxious", "depressed", "depression", "lonely", "loneliness",
+        "isolated", "isolation", "grief", "grieving", "stress", "stressed", "fear", "afraid",
+        "overwhelmed", "trauma", "traumatic", "suicidal", "hopeless", "calm", "emotional",
+        "frustrated", "anger", "mental", "phobia", "nightmares", "solitude", "despair",
+    ],
+    "communication": [
+        "conflict", "argument", "negotiate", "negotiation", "de-escalate", "dispute",
+        "neighbor", "neighbors", "crowd", "group", "leader", "instructions to", "explain to",
+        "communicate", "communication", "language barrier", "hostile", "confrontation",
+        "mediate", "authorities", "detained", "embassy", "community", "riot", "protest",
+    ],
+    "education": [
+        "teach", "teaching", "learn", "learning", "lesson", "explain", "child about",
+        "student", "students", "homework", "math", "science", "history", "skill", "skills",
+        "knowledge", "parent needs", "how to read", "principles", "building a", "making a",
+        "phases", "astronomy", "knitting", "weaving", "loom",
+    ],
+}
+
+# 5. Minimum number of seed examples a category needs before the model is trained.
+MIN_SEED_EXAMPLES = 5
+
+# 6. Label quality check: the seed labels are split into this many folds, and
+#    each fold is labelled by a model trained on the others. Labels below
+#    LOW_CONFIDENCE are counted separately in the final summary.
+AGREEMENT_FOLDS = 5
+LOW_CONFIDENCE = 0.5
+
+# 7. How much the situation's own label contributes to each question's label.
+#    Most questions ("What should I do first?") only make sense in the context of
+#    their situation; the rest of the weight lets clearly off-topic questions
+#    (a first-aid question inside a vehicle breakdown) carry their own category.
+SITUATION_WEIGHT = 0.6
+
+SITUATION_NUMBER_PATTERN = re.compile(r'^\s*\d+\.\s*')
+
+
+def strip_situation_number(situation):
+    """Removes the leading "123." numbering from a situation line."""
+    return SITUATION_NUMBER_PATTERN.sub('', situation)
+
+
+def keyword_scores(text):
+    """Counts how many seed keywords of each category appear in the text."""
+    lowered = text.lower()
+    scores = Counter()
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        for keyword in keywords:
+            if re.search(r'\b' + re.escape(keyword) + r'\b', lowered):
+                scores[category] += 1
+    return scores
+
+
+def seed_labels(texts):
+    """
+    Weakly labels the texts whose keyword hits point to a single category.
+    Returns a list of (index, category) pairs for the unambiguous texts.
+    """
+    labelled = []
+    for i, text in enumerate(texts):
+        ranked = keyword_scores(text).most_common(2)
+        if not ranked:
+            continue
+        if len(ranked) == 2 and ranked[0][1] == ranked[1][1]:
+            continue  # Tie between two categories, too ambiguous to learn from
+        labelled.append((i, ranked[0][0]))
+    return labelled
+
+
+def new_model():
+    return LogisticRegression(max_iter=1000, class_weight="balanced", C=4.0)
+
+
+def seed_agreement(features, seed_targets):
+    """
+    Estimates label quality before anything is labelled: every seed is
+    predicted by a model that did not see it, and the prediction is compared
+    with its keyword label. Prints the agreement per category and the most
+    common confusions, and returns the overall agreement.
+    """
+    smallest = min(Counter(seed_targets).values())
+    folds = min(AGREEMENT_FOLDS, smallest)
+    if folds < 2:
+        print("Not enough seed labels per category to check agreement.")
+        return None
+    predicted = cross_val_predict(new_model(), features, seed_targets,
+                                  cv=StratifiedKFold(folds, shuffle=True, random_state=0))
+
+    agreement = float(np.mean(predicted == np.array(seed_targets)))
+    print(f"Held-out agreement with the seed labels ({folds} folds): {agreement:.1%}")
+    by_category = Counter(seed_targets)
+    correct = Counter(t for t, p in zip(seed_targets, predicted) if t == p)
+    for category in sorted(by_category):
+        print(f"  {category}: {correct[category] / by_category[category]:.1%} of {by_category[category]}")
+    confusions = Counter((t, p) for t, p in zip(seed_targets, predicted) if t != p)
+    if confusions:
+        print("Most common confusions (seed label -> predicted):")
+        for (target, prediction), count in confusions.most_common(5):
+            print(f"  {target} -> {prediction}: {count}")
+    return agreement
+
+
+def train_classifier(situations):
+    """
+    Fits a TF-IDF + logistic regression model on the keyword-labelled situations.
+    Returns the fitted (vectorizer, model) pair.
+    """
+    texts = [strip_situation_number(s) for s in situations]
+    labelled = seed_labels(texts)
+    counts = Counter(category for _, category in labelled)
+    print(f"Seed labels from keywords: {len(labelled)} of {len(texts)} situations.")
+    for category in CATEGORY_KEYWORDS:
+        print(f"  {category}: {counts.get(category, 0)}")
+        if counts.get(category, 0) < MIN_SEED_EXAMPLES:
+            print(f"Warning: only {counts.get(category, 0)} seed examples for '{category}'. "
+                  f"Consider extending its keywords.")
+
+    # The vocabulary is fitted on every situation (not just the seeds) so that
+    # words only seen in unlabelled situations still get a sensible IDF.
+    vectorizer = TfidfVectorizer(ngram_range=(1, 2), min_df=2, sublinear_tf=True, stop_words="english")
+    vectorizer.fit(texts)
+
+    seed_features = vectorizer.transform([texts[i] for i, _ in labelled])
+    seed_targets = [category for _, category in labelled]
+    seed_agreement(seed_features, seed_targets)
+    model = new_model()
+    model.fit(seed_features, seed_targets)
+    return vectorizer, model
+
+
+def classify_situations(vectorizer, model, situations):
+    """
+    Labels all situations in one batch.
+    Returns (categories, probabilities) where probabilities has one row per situation.
+    """
+    texts = [strip_situation_number(s) for s in situations]
+    probabilities = model.predict_proba(vectorizer.transform(texts))
+    categories = [model.classes_[i] for i in probabilities.argmax(axis=1)]
+    return categories, probabilities
+
+
+def classify_questions(vectorizer, model, situation_probabilities, questions_by_situation):
+    """
+    Labels every question in one batch, blending the question's own prediction
+    with that of the situation it was generated for.
+    Returns a dict mapping situation -> {question: category}.
+    """
+    pairs = [(s, q) for s, questions in questions_by_situation.items() for q in sorted(questions)]
+    if not pairs:
+        return {}
+
+    question_probabilities = model.predict_proba(vectorizer.transform([q for _, q in pairs]))
+    labels = {}
+    for (situation, question), probs in zip(pairs, question_probabilities):
+        situation_probs = situation_probabilities.get(situation)
+        if situation_probs is not None:
+            probs = SITUATION_WEIGHT * situation_probs + (1 - SITUATION_WEIGHT) * probs
+        labels.setdefault(situation, {})[question] = model.classes_[int(np.argmax(probs))]
+    return labels
+
+
+# --- Main Script Logic ---
+def main():
+    """Labels every situation and question with a category."""
+    try:
+        with open(SITUATIONS_FILE, 'r', encoding='utf-8') as f:
+            situations = [line.strip() for line in f if line.strip()]
+    except FileNotFoundError:
+        print(f"Error: The file '{SITUATIONS_FILE}' was not found.")
+        return
+    print(f"Loaded {len(situations)} situations from '{SITUATIONS_FILE}'.")
+
+    # Question files can contain situations that are missing from (or worded
+    # differently in) situations.txt, so those are labelled as well.
+    questions_by_situation = consolidate_question_files(QUESTION_FILES)
+    all_situations = list(dict.fromkeys(situations + list(questions_by_situation)))
+
+    print("\n--- Phase 1: Training the category classifier ---")
+    vectorizer, model = train_classifier(situations)
+
+    print("\n--- Phase 2: Labelling situations and questions ---")
+    categories, probabilities = classify_situations(vectorizer, model, all_situations)
+    situation_probabilities = dict(zip(all_situations, probabilities))
+    question_labels = classify_questions(vectorizer, model, situation_probabilities, questions_by_situation)
+
+    with open(OUTPUT_JSONL_FILE, 'w', encoding='utf-8') as f_out:
+        for situation, category, probs in zip(all_situations, categories, probabilities):
+            json_record = {
+                "situation": situation,
+                "category": category,
+                "confidence": round(float(probs.max()), 4),
+                "questions": question_labels.get(situation, {}),
+            }
+            f_out.write(json.dumps(json_record, ensure_ascii=False) + "\n")
+
+    situation_counts = Counter(categories)
+    low_confidence_counts = Counter(c for c, probs in zip(categories, probabilities) if probs.max() < LOW_CONFIDENCE)
+    question_counts = Counter(c for labels in question_labels.values() for c in labels.values())
+    print(f"\n{'Category':<16}{'Situations':>12}{'Low conf.':>12}{'Questions':>12}")
+    for category in model.classes_:
+        print(f"{category:<16}{situation_counts.get(category, 0):>12}{low_confidence_counts.get(category, 0):>12}"
+              f"{question_counts.get(category, 0):>12}")
+    print(f"'Low conf.' counts situations labelled with a confidence below {LOW_CONFIDENCE}; "
+          f"check a sample of them before setting quotas.")
+
+    print(f"\nCategories saved to: {OUTPUT_JSONL_FILE}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+# --- Configuration ---
+# 1. Columns that repeat the same value on many rows. Parquet stores each
+#    distinct value once per row group and refers to it by index, which is what
+#    makes the repeated situation text on every record almost free on disk.
+DICTIONARY_COLUMNS = ["context", "situation"]
+
+# 2. Compression codec and level for every column. zstd gives much smaller
+#    files than the default snappy on long markdown responses and still
+#    decompresses faster than the JSON can be parsed.
+COMPRESSION = "zstd"
+COMPRESSION_LEVEL = 9
+
+# 3. Rows per row group. Smaller groups let a reader skip data when it only
+#    needs some rows; larger ones compress the responses better.
+ROW_GROUP_SIZE = 50_000
+
+
+def is_parquet(filename):
+    """Returns True if the file should be read and written as Parquet."""
+    return filename.endswith(".parquet")
+
+
+def read_jsonl(filename):
+    """Reads a JSONL file into a list of dicts, skipping malformed lines."""
+    records = []
+    with open(filename, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+def write_parquet(records, filename):
+    """Writes a list of dicts to a compressed, dictionary-encoded Parquet file."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pylist(records)
+    pq.write_table(
+        table,
+        filename,
+        compression=COMPRESSION,
+        compression_level=COMPRESSION_LEVEL,
+        use_dictionary=[c for c in DICTIONARY_COLUMNS if c in table.column_names],
+        row_group_size=ROW_GROUP_SIZE,
+    )
+    return table.num_rows
+
+
+def read_records(filename, columns=None):
+    """
+    Reads a dataset file (.parquet or JSONL) into a list of dicts.
+    If `columns` is given, only those columns are read (Parquet only skips the
+    others on disk; JSONL has to be parsed in full either way).
+    """
+    if is_parquet(filename):
+        import pyarrow.parquet as pq
+        return pq.read_table(filename, columns=columns).to_pylist()
+    records = read_jsonl(filename)
+    if columns is not None:
+        records = [{c: r.get(c) for c in columns} for r in records]
+    return records
+
+
+def read_column(filename, column):
+    """Reads a single column from a dataset file (.parquet or JSONL) as a list."""
+    if is_parquet(filename):
+        import pyarrow.parquet as pq
+        return pq.read_table(filename, columns=[column]).column(column).to_pylist()
+    return [r[column] for r in read_jsonl(filename) if column in r]
+
+
+def jsonl_to_parquet(jsonl_file, parquet_file):
+    """Converts a JSONL dataset to Parquet. Returns the number of rows written."""
+    return write_parquet(read_jsonl(jsonl_file), parquet_file)
+
+
+def parquet_to_jsonl(parquet_file, jsonl_file):
+    """
+    Converts a Parquet dataset back to JSONL. Non-ASCII characters are written
+    as-is instead of as \\u escapes. Returns the number of rows written.
+    """
+    records = read_records(parquet_file)
+    with open(jsonl_file, 'w', encoding='utf-8') as f_out:
+        for record in records:
+            f_out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return len(records)
+
+
+def questions_to_parquet(consolidated_data, parquet_file):
+    """
+    Writes a situation -> questions mapping (as returned by
+    consolidate_question_files) to Parquet with one row per question.
+    """
+    records = [
+        {"situation": situation, "question": question}
+        for situation, questions in consolidated_data.items()
+        for question in sorted(questions)
+    ]
+    return write_parquet(records, parquet_file)
+
+
+def read_questions_parquet(parquet_file):
+    """Reads a question Parquet file back into a situation -> set of questions mapping."""
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(parquet_file, columns=["situation", "question"])
+    consolidated_data = {}
+    for situation, question in zip(table.column("situation").to_pylist(), table.column("question").to_pylist()):
+        consolidated_data.setdefault(situation, set()).add(question)
+    return consolidated_data
+
+
+def _timed(fn, repeats):
+    """Runs fn `repeats` times and returns the best wall-clock time in seconds."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark(jsonl_file, repeats=5):
+    """
+    Compares disk size and load times of a JSONL dataset and its Parquet
+    equivalent: a full load, the resume check (instruction column only) and,
+    if the `datasets` library is installed, load_dataset() as used for training.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        parquet_file = os.path.join(tmp_dir, "dataset.parquet")
+        num_rows = jsonl_to_parquet(jsonl_file, parquet_file)
+
+        results = {
+            "rows": num_rows,
+            "jsonl_bytes": os.path.getsize(jsonl_file),
+            "parquet_bytes": os.path.getsize(parquet_file),
+            "full_load_s": {
+                "jsonl": _timed(lambda: read_records(jsonl_file), repeats),
+                "parquet": _timed(lambda: read_records(parquet_file), repeats),
+            },
+            "resume_load_s": {
+                "jsonl": _timed(lambda: set(read_column(jsonl_file, "instruction")), repeats),
+                "parquet": _timed(lambda: set(read_column(parquet_file, "instruction")), repeats),
+            },
+        }
+
+        try:
+            from datasets import load_dataset
+        except ImportError:
+            print("Note: 'datasets' is not installed, skipping the load_dataset() benchmark.")
+        else:
+            cache_dir = os.path.join(tmp_dir, "hf_cache")
+            results["load_dataset_s"] = {
+                "jsonl": _timed(lambda: load_dataset("json", data_files=jsonl_file, split="train",
+                                                     cache_dir=cache_dir, download_mode="force_redownload"), repeats),
+                "parquet": _timed(lambda: load_dataset("parquet", data_files=parquet_file, split="train",
+                                                       cache_dir=cache_dir, download_mode="force_redownload"), repeats),
+            }
+    return results
+
+
+def print_benchmark(jsonl_file, results):
+    """Prints the benchmark results as a small table."""
+    print(f"\nBenchmark for {jsonl_file} ({results['rows']} rows)")
+    ratio = results["jsonl_bytes"] / max(results["parquet_bytes"], 1)
+    print(f"  Disk size:   JSONL {results['jsonl_bytes'] / 1024:10.1f} KiB | "
+          f"Parquet {results['parquet_bytes'] / 1024:10.1f} KiB | {ratio:.1f}x smaller")
+    for key, label in [("full_load_s", "Full load"), ("resume_load_s", "Resume check"),
+                       ("load_dataset_s", "load_dataset")]:
+        if key not in results:
+            continue
+        timings = results[key]
+        speedup = timings["jsonl"] / max(timings["parquet"], 1e-9)
+        print(f"  {label + ':':<13}JSONL {timings['jsonl'] * 1000:9.1f} ms  | "
+              f"Parquet {timings['parquet'] * 1000:9.1f} ms  | {speedup:.1f}x faster")
+
+
+# --- Main Script Logic ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the teacher datasets between JSONL and Parquet.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    to_parquet = subparsers.add_parser("to-parquet", help="Convert a JSONL dataset to Parquet.")
+    to_parquet.add_argument("input")
+    to_parquet.add_argument("output")
+
+    to_jsonl = subparsers.add_parser("to-jsonl", help="Convert a Parquet dataset back to JSONL.")
+    to_jsonl.add_argument("input")
+    to_jsonl.add_argument("output")
+
+    questions = subparsers.add_parser("questions", help="Convert question .txt files to one Parquet file.")
+    questions.add_argument("inputs", nargs="+")
+    questions.add_argument("--output", required=True)
+
+    bench = subparsers.add_parser("benchmark", help="Compare load time and disk size of JSONL vs Parquet.")
+    bench.add_argument("inputs", nargs="+")
+    bench.add_argument("--repeats", type=int, default=5)
+
+    args = parser.parse_args()
+
+    if args.command == "to-parquet":
+        rows = jsonl_to_parquet(args.input, args.output)
+        print(f"Wrote {rows} rows to {args.output}")
+    elif args.command == "to-jsonl":
+        rows = parquet_to_jsonl(args.input, args.output)
+        print(f"Wrote {rows} rows to {args.output}")
+    elif args.command == "questions":
+        from create_training_dataset import consolidate_question_files
+        rows = questions_to_parquet(consolidate_question_files(args.inputs), args.output)
+        print(f"Wrote {rows} questions to {args.output}")
+    elif args.command == "benchmark":
+        for input_file in args.inputs:
+            print_benchmark(input_file, benchmark(input_file, args.repeats))
@@ -1,15 +1,22 @@
-import requests
 import json
 import os
 import re
-import time
 import random
-from tqdm import tqdm # Import tqdm
+
+from columnar_store import is_parquet, read_column, read_questions_parquet
+from ollama_scheduler import AdaptiveScheduler, RetryQueue
+from teacher_router import hedge_models, hedged_generate, load_routing_table, route_model, timed_generate
 
 # --- Configuration ---
+# Paths below are relative to this script, so it can be run from anywhere.
+# `python main.py build` overrides them from pipeline.toml.
+DATASET_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(DATASET_DIR, "..", "scripts")
+
 # 1. IMPORTANT: Update this list with the names of all your generated question files.
+#    Question files converted with `columnar_store.py questions` (.parquet) work too.
 QUESTION_FILES = [
-    "/home/dell-pc-03/Offline-Mobile-LLM/LLM/dataset/gpt-oss_questions.txt",
+    os.path.join(DATASET_DIR, "gpt-oss_questions.txt"),
     # "llama3.1_questions_cleaned.txt", # Use the cleaned versions of your files
     # "deepseek-r1_questions_cleaned.txt"
     # "mixtral_questions_cleaned.txt"
@@ -26,20 +33,48 @@ RANDOM_SEED = 42
 # 4. The local model that will act as the "teacher" to provide the answers.
 TEACHER_MODEL = "gpt-oss"
 
-# 5. The final output file, ready for training.
-OUTPUT_JSONL_FILE = "/home/dell-pc-03/Offline-Mobile-LLM/LLM/scripts/teacher_dataset.jsonl"
+#    How the teacher is chosen for each question:
+#    "static" - always TEACHER_MODEL.
+#    "routed" - the cheapest model that met the quality floor for the question's
+#               category, from the table written by teacher_router.py.
+#    "hedged" - ask the table's two models for the category at once and keep the
+#               first answer that meets the quality floor. Lowers latency,
+#               but every question costs both generations.
+ROUTING_POLICY = "static"
+ROUTING_TABLE_FILE = os.path.join(DATASET_DIR, "teacher_routing.json")
+
+# 5. The final output file, ready for training. Answers are appended to it as
+#    JSONL; a compacted copy made with `columnar_store.py to-parquet` next to it
+#    (same name, .parquet extension) is also checked when resuming.
+OUTPUT_JSONL_FILE = os.path.join(SCRIPTS_DIR, "teacher_dataset.jsonl")
+
+# 6. Optional per-category question quotas for stratified sampling.
+#    Requires the labels written by classify_situations.py. When empty, every
+#    situation gets QUESTIONS_PER_SITUATION questions as before. Categories that
+#    are not listed here also fall back to QUESTIONS_PER_SITUATION per situation.
+#    Example: {"medical": 1500, "survival": 1500, "education": 600}
+CATEGORY_QUOTAS = {}
+CATEGORIES_FILE = os.path.join(DATASET_DIR, "situation_categories.jsonl")
 
 OLLAMA_API_URL = "http://localhost:11434/api/generate"
 
-# 6. The system prompt to guide the teacher model to give high-quality answers.
+# Upper bound on requests sent to Ollama at once; the scheduler adapts below it
+# to how the server is coping (raise OLLAMA_NUM_PARALLEL on the server to match).
+MAX_CONCURRENCY = 4
+
+# Questions that still failed after the scheduler's retries are kept here and
+# retried first on the next run.
+RETRY_QUEUE_FILE = os.path.join(SCRIPTS_DIR, "teacher_dataset_retry.json")
+
+# 7. The system prompt to guide the teacher model to give high-quality answers.
 TEACHER_SYSTEM_PROMPT = """
 You are an expert AI assistant. Your purpose is to provide clear, safe, factual, and actionable guidance for offline situations. Based on the context of the situation provided, give a direct, helpful, and comprehensive answer to the user's question. Prioritize safety and practical, step-by-step instructions. If the situation is inherently dangerous, you must include a warning to seek professional help if available, but you must still provide the best possible immediate guidance for a person who has no other options.
 """
 
-def parse_question_files(filenames, num_questions, seed):
+def consolidate_question_files(filenames):
     """
-    Reads all question files, consolidates them, and randomly samples a
-    fixed number of questions for each situation.
+    Reads all question files and consolidates them into a dictionary mapping
+    each situation to the set of unique questions generated for it.
     """
     consolidated_data = {}
     
@@ -49,6 +84,11 @@ def parse_question_files(filenames, num_questions, seed):
             continue
         
         print(f"Parsing file: {filename}")
+        if is_parquet(filename):
+            for situation, questions in read_questions_parquet(filename).items():
+                consolidated_data.setdefault(situation, set()).update(questions)
+            continue
+
         with open(filename, 'r', encoding='utf-8') as f:
             content = f.read()
         
@@ -69,6 +109,15 @@ def parse_question_files(filenames, num_questions, seed):
             
             consolidated_data[situation].update(questions)
             
+    return consolidated_data
+
+def parse_question_files(filenames, num_questions, seed):
+    """
+    Reads all question files, consolidates them, and randomly samples a
+    fixed number of questions for each situation.
+    """
+    consolidated_data = consolidate_question_files(filenames)
+            
     # --- Logic for sampling questions ---
     random.seed(seed) # Set the seed for reproducibility
     sampled_data = {}
@@ -85,9 +134,93 @@ def parse_question_files(filenames, num_questions, seed):
             
     return sampled_data
 
-def generate_answer(model_name, context, question):
+def load_categories(filename):
+    """
+    Reads the labels written by classify_situations.py.
+    Returns (situation_categories, question_categories) where the latter maps
+    (situation, question) pairs to their category.
+    """
+    situation_categories = {}
+    question_categories = {}
+    with open(filename, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            situation_categories[data['situation']] = data['category']
+            for question, category in data.get('questions', {}).items():
+                question_categories[(data['situation'], question)] = category
+    return situation_categories, question_categories
+
+def stratified_sample(consolidated_data, situation_categories, question_categories, quotas, num_questions, seed):
+    """
+    Samples questions so that each category in `quotas` gets (up to) its quota
+    of questions in total, spread round-robin over that category's situations.
+    Questions in categories without a quota fall back to `num_questions` per
+    situation (0 meaning all of them).
+    """
+    rng = random.Random(seed)
+    buckets = {}  # category -> {situation: [questions]}
+    for situation in sorted(consolidated_data):
+        questions_list = sorted(consolidated_data[situation])
+        rng.shuffle(questions_list)
+        for question in questions_list:
+            category = question_categories.get(
+                (situation, question), situation_categories.get(situation, "uncategorized"))
+            buckets.setdefault(category, {}).setdefault(situation, []).append(question)
+
+    sampled_data = {}
+    fallback = {}  # situation -> its questions in categories without a quota
+    for category, by_situation in buckets.items():
+        if category in quotas:
+            # Take one question per situation per round until the quota is met,
+            # so a small quota still covers as many situations as possible.
+            situations = list(by_situation)
+            rng.shuffle(situations)
+            remaining = quotas[category]
+            depth = 0
+            while remaining > 0 and situations:
+                situations = [s for s in situations if depth < len(by_situation[s])]
+                for situation in situations:
+                    if remaining == 0:
+                        break
+                    sampled_data.setdefault(situation, []).append(by_situation[situation][depth])
+                    remaining -= 1
+                depth += 1
+        else:
+            for situation, questions_list in by_situation.items():
+                fallback.setdefault(situation, []).extend(questions_list)
+
+    # The fallback cap applies per situation, however many categories its
+    # questions span; reshuffle so no category is favoured by the cut.
+    for situation, questions_list in fallback.items():
+        rng.shuffle(questions_list)
+        selected = questions_list[:num_questions] if num_questions > 0 else questions_list
+        sampled_data.setdefault(situation, []).extend(selected)
+
+    # Keep the situations in file order, like parse_question_files does.
+    return {s: sampled_data[s] for s in consolidated_data if s in sampled_data}
+
+def load_processed_questions(output_file):
+    """
+    Returns the set of questions already answered in the output file and in
+    its compacted Parquet copy, if one exists.
+    """
+    processed_questions = set()
+    parquet_file = os.path.splitext(output_file)[0] + ".parquet"
+    for filename in dict.fromkeys([output_file, parquet_file]):
+        if os.path.exists(filename):
+            processed_questions.update(read_column(filename, 'instruction'))
+    return processed_questions
+
+def build_teacher_prompt(context, question):
+    """Builds the prompt sent to the teacher model for a question."""
+    return f"Context of the situation:\n{context}\n\nUser's question:\n{question}"
+
+def generate_answer(model_name, context, question, scheduler):
     """Queries the teacher model for an answer."""
-    prompt = f"Context of the situation:\n{context}\n\nUser's question:\n{question}"
+    prompt = build_teacher_prompt(context, question)
     
     payload = {
         "model": model_name,
@@ -96,72 +229,125 @@ def generate_answer(model_name, context, question):
         "stream": False,
     }
     
-    try:
-        response = requests.post(OLLAMA_API_URL, json=payload, timeout=300)
-        response.raise_for_status()
-        return response.json().get("response", "").strip()
-    except requests.exceptions.RequestException as e:
-        # The print statement will correctly appear above the tqdm bar.
-        print(f"\nError querying teacher model '{model_name}': {e}")
+    # The scheduler retries transient errors and prints the final one above the tqdm bar.
+    response_json = scheduler.generate(payload)
+    if response_json is None:
         return None
+    return response_json.get("response", "").strip()
+
+def generate_routed_answer(routing_table, policy, category, context, question, scheduler):
+    """Queries the teacher(s) the routing table picks for the question's category."""
+    prompt = build_teacher_prompt(context, question)
+    if policy == "hedged":
+        result = hedged_generate(hedge_models(routing_table, category), prompt, TEACHER_SYSTEM_PROMPT,
+                                 routing_table["quality_floor"], scheduler)
+    else:
+        result = timed_generate(route_model(routing_table, category), prompt, TEACHER_SYSTEM_PROMPT, scheduler)
+    return result["response"] if result else None
 
 # --- Main Script Logic ---
-if __name__ == "__main__":
+def main(dry_run=False):
+    """Builds the teacher dataset. With dry_run, only reports what would be generated."""
     # 1. Parse and consolidate all questions, applying the sampling logic
     print("--- Phase 1: Consolidating, Deduplicating, and Sampling Questions ---")
-    all_data = parse_question_files(QUESTION_FILES, QUESTIONS_PER_SITUATION, RANDOM_SEED)
+    situation_categories, question_categories = {}, {}
+    if CATEGORY_QUOTAS and not os.path.exists(CATEGORIES_FILE):
+        print(f"Error: The file '{CATEGORIES_FILE}' was not found.")
+        print("Category quotas need the labels written by `python main.py classify`. Run it first.")
+        return
+    if CATEGORY_QUOTAS or (ROUTING_POLICY != "static" and os.path.exists(CATEGORIES_FILE)):
+        situation_categories, question_categories = load_categories(CATEGORIES_FILE)
+    if CATEGORY_QUOTAS:
+        all_data = stratified_sample(consolidate_question_files(QUESTION_FILES), situation_categories,
+                                     question_categories, CATEGORY_QUOTAS, QUESTIONS_PER_SITUATION, RANDOM_SEED)
+        selected_per_category = {}
+        for situation, questions in all_data.items():
+            for question in questions:
+                category = question_categories.get(
+                    (situation, question), situation_categories.get(situation, "uncategorized"))
+                selected_per_category[category] = selected_per_category.get(category, 0) + 1
+        for category, count in sorted(selected_per_category.items()):
+            quota = CATEGORY_QUOTAS.get(category)
+            print(f"  {category}: {count} questions" + (f" (quota {quota})" if quota is not None else ""))
+    else:
+        all_data = parse_question_files(QUESTION_FILES, QUESTIONS_PER_SITUATION, RANDOM_SEED)
     total_questions = sum(len(qs) for qs in all_data.values())
     print(f"Consolidation complete. Found {len(all_data)} unique situations and selected {total_questions} total questions to process.\n")
     
     # 2. Load already answered questions to allow for resuming
-    processed_questions = set()
-    if os.path.exists(OUTPUT_JSONL_FILE):
-        with open(OUTPUT_JSONL_FILE, 'r', encoding='utf-8') as f:
-            for line in f:
-                try:
-                    data = json.loads(line)
-                    processed_questions.add(data['instruction'])
-                except json.JSONDecodeError:
-                    continue
-        if processed_questions:
-            print(f"Found {len(processed_questions)} questions already answered in the output file. Resuming process.\n")
+    processed_questions = load_processed_questions(OUTPUT_JSONL_FILE)
+    if processed_questions:
+        print(f"Found {len(processed_questions)} questions already answered in the output file. Resuming process.\n")
         
-    # 3. Create the final list of questions that still need answers
+    # 3. Create the final list of questions that still need answers, previously failed ones first
+    retry_queue = RetryQueue(RETRY_QUEUE_FILE)
     questions_to_process = []
     for situation, questions in all_data.items():
         for question in questions:
-            if question not in processed_questions:
+            if question in processed_questions:
+                if not dry_run:  # A dry run must leave the retry queue file alone
+                    retry_queue.remove(question)
+            elif len(question.split()) >= 5: # Safety check for short questions (less than 5 words)
                 questions_to_process.append((situation, question))
+    questions_to_process.sort(key=lambda item: item[1] not in retry_queue)
+    if len(retry_queue):
+        print(f"Found {len(retry_queue)} failed questions in '{RETRY_QUEUE_FILE}'. They will be retried first.\n")
 
     if not questions_to_process:
         print("All selected questions have already been answered. Dataset is complete.")
-        exit()
+        return
+
+    if dry_run:
+        print(f"Dry run: {len(questions_to_process)} questions would be sent to the teacher. Nothing was generated.")
+        return
         
+    routing_table = None
+    if ROUTING_POLICY != "static":
+        routing_table = load_routing_table(ROUTING_TABLE_FILE)
+        print(f"Routing teachers with the '{ROUTING_POLICY}' policy from {ROUTING_TABLE_FILE}.\n")
+
+    # A hedged request needs two slots, so start with enough of them.
+    scheduler = AdaptiveScheduler(OLLAMA_API_URL, initial_concurrency=2 if ROUTING_POLICY == "hedged" else 1,
+                                  max_concurrency=MAX_CONCURRENCY)
+    if not scheduler.wait_until_healthy():
+        print(f"Error: The Ollama server at {scheduler.base_url} is not responding.")
+        return
+
+    def answer(item):
+        situation, question = item
+        if routing_table:
+            category = question_categories.get(
+                (situation, question), situation_categories.get(situation, "uncategorized"))
+            return generate_routed_answer(routing_table, ROUTING_POLICY, category, situation, question, scheduler)
+        return generate_answer(TEACHER_MODEL, situation, question, scheduler)
+
     print(f"--- Phase 2: Generating Answers for {len(questions_to_process)} Remaining Questions ---")
     
     # Open the output file and start the main loop with a tqdm progress bar
+    from tqdm import tqdm
     with open(OUTPUT_JSONL_FILE, 'a', encoding='utf-8') as f_out:
-        for situation, question in tqdm(questions_to_process, desc="Generating Answers"):
-            
-            # Safety check for short questions (less than 5 words)
-            if len(question.split()) < 5:
-                # We can skip this question; the progress bar will just continue.
-                continue
-            
-            answer = generate_answer(TEACHER_MODEL, situation, question)
-            
-            if answer:
+        results = scheduler.map_unordered(answer, questions_to_process)
+        for (situation, question), answer_text in tqdm(results, total=len(questions_to_process), desc="Generating Answers"):
+            if answer_text:
                 json_record = {
                     "instruction": question,
-                    "response": answer,
+                    "response": answer_text,
                     "context": situation
                 }
                 f_out.write(json.dumps(json_record) + "\n")
+                f_out.flush()
+                retry_queue.remove(question)
             else:
                 # This message will print above the progress bar if an error occurs
-                print(f"  -> FAILED to get an answer for question: '{question}'. Will retry on next run.")
+                print(f"  -> FAILED to get an answer for question: '{question}'. Queued for the next run.")
+                retry_queue.add(question, {"situation": situation, "question": question}, "no response")
 
-            time.sleep(1) # Small delay to be nice to the Ollama server
+    stats = scheduler.stats()
+    print(f"\nRequests: {stats['requests']}, retries: {stats['retries']}, failures: {stats['failures']}, "
+          f"final concurrency: {stats['concurrency']}.")
 
     print("\n--- Dataset Creation Complete ---")
-    print(f"Your final, training-ready dataset is saved to: {OUTPUT_JSONL_FILE}")
\ No newline at end of file
+    print(f"Your final, training-ready dataset is saved to: {OUTPUT_JSONL_FILE}")
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,7 @@
-import requests
-import json
 import os
 import re
-import time
+
+from ollama_scheduler import AdaptiveScheduler, RetryQueue
 
 # --- Configuration ---
 SITUATIONS_FILE = "situations.txt"
@@ -31,23 +30,36 @@ MODELS_TO_QUERY = [
 ]
 OLLAMA_API_URL = "http://localhost:11434/api/generate"
 
-def get_last_processed_situation_number(filename):
-    """Reads an output file and finds the highest situation number processed."""
+# Where the <model>_questions.txt files are written (the current directory by default).
+OUTPUT_DIR = ""
+
+# Upper bound on requests sent to Ollama at once; the scheduler adapts below it
+# to how the server is coping (raise OLLAMA_NUM_PARALLEL on the server to match).
+MAX_CONCURRENCY = 4
+
+# Situations that still failed after the scheduler's retries are kept here and
+# retried first on the next run.
+RETRY_QUEUE_FILE = "generate_questions_retry.json"
+
+def get_processed_situation_numbers(filename):
+    """Reads an output file and returns the numbers of all situations already processed."""
     if not os.path.exists(filename):
-        return 0
-    last_num = 0
+        return set()
+    processed = set()
     try:
         with open(filename, 'r', encoding='utf-8') as f:
             content = f.read()
-            # Find all numbers that start a line and are followed by a period.
-            found_numbers = re.findall(r'^\s*(\d+)\.', content, re.MULTILINE)
-            if found_numbers:
-                last_num = max(int(n) for n in found_numbers)
+        # Situations are answered concurrently, so they are not in order. Each
+        # block starts with its numbered situation line, followed by the questions.
+        for block in re.split(r'\n\s*\n', content):
+            match = re.match(r'^\s*(\d+)\.', block.strip())
+            if match:
+                processed.add(int(match.group(1)))
     except Exception as e:
-        print(f"Warning: Could not parse {filename} to find last situation number. Starting from scratch. Error: {e}")
-    return last_num
+        print(f"Warning: Could not parse {filename} to find processed situations. Starting from scratch. Error: {e}")
+    return processed
 
-def get_questions_from_ollama(model_name, situation_text):
+def get_questions_from_ollama(model_name, situation_text, scheduler):
     """Sends a situation to a local Ollama model and gets generated questions."""
     # Construct the full prompt for the model
     full_prompt = f"Situation:\n{situation_text}\n\n{QUESTION_GENERATION_PROMPT_TEMPLATE}"
@@ -58,14 +70,11 @@ def get_questions_from_ollama(model_name, situation_text):
         "stream": False,
     }
     
-    try:
-        response = requests.post(OLLAMA_API_URL, json=payload, timeout=300) # 5 min timeout
-        response.raise_for_status()
-        response_json = response.json()
-        return response_json.get("response", "").strip()
-    except requests.exceptions.RequestException as e:
-        print(f"\nError querying model '{model_name}': {e}")
+    # The scheduler retries transient errors and prints the final one.
+    response_json = scheduler.generate(payload)
+    if response_json is None:
         return None
+    return response_json.get("response", "").strip()
 
 def format_questions(raw_text):
     """Cleans and re-numbers the questions from the LLM's raw output."""
@@ -81,7 +90,8 @@ def format_questions(raw_text):
     return "\n".join(formatted_lines)
 
 # --- Main Script Logic ---
-if __name__ == "__main__":
+def main(dry_run=False):
+    """Generates questions for every situation. With dry_run, only reports what is left to do."""
     print("Starting question generation process...")
 
     # 1. Read all situations from the file
@@ -90,53 +100,80 @@ if __name__ == "__main__":
             situations = [line.strip() for line in f if line.strip()]
         if not situations:
             print(f"Error: No situations found in '{SITUATIONS_FILE}'.")
-            exit()
+            return
         print(f"Loaded {len(situations)} situations from '{SITUATIONS_FILE}'.")
     except FileNotFoundError:
         print(f"Error: The file '{SITUATIONS_FILE}' was not found.")
-        exit()
+        return
+
+    retry_queue = RetryQueue(RETRY_QUEUE_FILE)
+    if len(retry_queue):
+        print(f"Found {len(retry_queue)} failed situations in '{RETRY_QUEUE_FILE}'. They will be retried first.")
 
     # 2. Loop through each model
     for model in MODELS_TO_QUERY:
-        output_filename = f"{model.replace(':', '-')}_questions.txt"
+        output_filename = os.path.join(OUTPUT_DIR, f"{model.replace(':', '-')}_questions.txt")
         print(f"\n--- Processing model: {model} ---")
         
         # 3. Check where to resume from
-        last_processed_num = get_last_processed_situation_number(output_filename)
-        if last_processed_num > 0:
-            print(f"Resuming for '{model}'. Last situation processed was #{last_processed_num}.")
+        processed_numbers = get_processed_situation_numbers(output_filename)
+        if processed_numbers:
+            print(f"Resuming for '{model}'. {len(processed_numbers)} situations already processed.")
+        
+        # 4. Collect the situations that still need questions, previously failed ones first
+        pending = []
+        for situation_line in situations:
+            # Extract the number from the situation line (e.g., "1. Some text")
+            match = re.match(r'^\s*(\d+)\.(.*)', situation_line)
+            if not match:
+                continue # Skip lines that are not correctly numbered
+            
+            current_num = int(match.group(1))
+            # If this situation is already processed, skip it
+            if current_num in processed_numbers:
+                if not dry_run:  # A dry run must leave the retry queue file alone
+                    retry_queue.remove(f"{model}:{current_num}")
+                continue
+            pending.append((current_num, situation_line, match.group(2).strip()))
+        pending.sort(key=lambda item: f"{model}:{item[0]}" not in retry_queue)
+        if dry_run:
+            print(f"Dry run: {len(pending)} situations would be sent to '{model}'.")
+            continue
+
+        # A scheduler per model: each model learns its own concurrency limit
+        # and latency baseline, and the stats below cover this model only.
+        scheduler = AdaptiveScheduler(OLLAMA_API_URL, max_concurrency=MAX_CONCURRENCY)
+        if not scheduler.wait_until_healthy():
+            print(f"Error: The Ollama server at {scheduler.base_url} is not responding.")
+            return
+        
+        def query(item):
+            current_num, situation_line, situation_text = item
+            print(f"  [{model}] Querying for situation #{current_num}: '{situation_text[:70]}...'")
+            return get_questions_from_ollama(model, situation_text, scheduler)
         
         # Open the output file in append mode to add new content
         with open(output_filename, 'a', encoding='utf-8') as f_out:
-            # 4. Loop through each situation line
-            for situation_line in situations:
-                # Extract the number from the situation line (e.g., "1. Some text")
-                match = re.match(r'^\s*(\d+)\.(.*)', situation_line)
-                if not match:
-                    continue # Skip lines that are not correctly numbered
-                
-                current_num = int(match.group(1))
-                situation_text = match.group(2).strip()
-                
-                # If this situation is already processed, skip it
-                if current_num <= last_processed_num:
-                    continue
-                
-                print(f"  [{model}] Querying for situation #{current_num}: '{situation_text[:70]}...'")
-                
-                generated_questions_raw = get_questions_from_ollama(model, situation_text)
-                
+            for (current_num, situation_line, _), generated_questions_raw in scheduler.map_unordered(query, pending):
+                retry_key = f"{model}:{current_num}"
                 if generated_questions_raw:
                     formatted_q = format_questions(generated_questions_raw)
                     
                     # Write the formatted block to the file
                     f_out.write(f"{situation_line}\n")
                     f_out.write(f"{formatted_q}\n\n")
+                    f_out.flush()
+                    retry_queue.remove(retry_key)
                 else:
-                    print(f"  [{model}] FAILED to get questions for situation #{current_num}. Skipping.")
-                    f_out.write(f"# FAILED for situation: {situation_line}\n\n")
-                
-                # A small delay to avoid overwhelming the server
-                time.sleep(1)
+                    print(f"  [{model}] FAILED to get questions for situation #{current_num}. Queued for the next run.")
+                    retry_queue.add(retry_key, {"model": model, "situation": situation_line}, "no response")
 
-    print("\nAll models processed. Question generation is complete.")
+        stats = scheduler.stats()
+        print(f"[{model}] Requests: {stats['requests']}, retries: {stats['retries']}, "
+              f"failures: {stats['failures']}, concurrency now {stats['concurrency']}.")
+
+    if not dry_run:
+        print("\nAll models processed. Question generation is complete.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Configuration ---
+# A stand-in for the Ollama server, for trying the pipeline scripts and the
+# scheduler in ollama_scheduler.py without a GPU. It answers /api/generate with
+# canned text after an injected delay and fails a configurable share of requests.
+DEFAULT_PORT = 11435
+
+MOCK_QUESTIONS = "\n".join(f"{i}. What should I do about step {i} of this situation right now?" for i in range(1, 16))
+
+MOCK_ANSWER = """Stay calm and make sure you are safe before doing anything else.
+
+1. Check yourself and anyone nearby for injuries.
+2. Move away from any immediate danger if it is safe to do so.
+3. Gather water, warm clothing and a light source.
+4. Follow the step-by-step guidance below and keep checking for changes.
+5. Seek professional help as soon as it becomes available.
+
+Warning: if symptoms get worse, stop and contact emergency services if you can."""
+
+
+class MockOllamaServer(ThreadingHTTPServer):
+    """
+    Mock Ollama server with injectable latency and failures.
+
+    latency_s / jitter_s  - base response time and random extra time.
+    error_rate            - share of requests answered with HTTP 500.
+    drop_rate             - share of connections closed without a response.
+    capacity              - requests the "GPU" serves at full speed; above it,
+                            latency grows with the load and the excess share of
+                            requests is rejected with HTTP 503.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port=DEFAULT_PORT, latency_s=0.2, jitter_s=0.1, error_rate=0.0, drop_rate=0.0,
+                 capacity=None, seed=None):
+        super().__init__(("127.0.0.1", port), MockOllamaHandler)
+        self.latency_s = latency_s
+        self.jitter_s = jitter_s
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.capacity = capacity
+        self.healthy = True
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.request_count = 0
+
+    @property
+    def api_url(self):
+        return f"http://127.0.0.1:{self.server_port}/api/generate"
+
+    def start(self):
+        """Serves requests from a background thread. Returns the server."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass  # Keep the console free for the client's output
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if not self.server.healthy:
+            self._send_json(503, {"error": "server unavailable"})
+        elif self.path == "/api/version":
+            self._send_json(200, {"version": "mock"})
+        elif self.path == "/api/tags":
+            self._send_json(200, {"models": []})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path != "/api/generate":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            payload = json.loads(body)
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": "invalid JSON"})
+            return
+
+        with server.lock:
+            server.in_flight += 1
+            server.request_count += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            load = server.in_flight
+            roll = server.random.random()
+            delay = server.latency_s + server.random.random() * server.jitter_s
+        try:
+            if not server.healthy:
+                self._send_json(503, {"error": "server unavailable"})
+                return
+            overload = server.capacity is not None and load > server.capacity
+            if overload:
+                delay *= load / server.capacity
+            time.sleep(delay)
+
+            if roll < server.drop_rate:
+                self.close_connection = True
+                self.connection.close()
+                return
+            if roll < server.drop_rate + server.error_rate:
+                self._send_json(500, {"error": "injected failure"})
+                return
+            if overload and server.random.random() < 1 - server.capacity / load:
+                self._send_json(503, {"error": "server busy"})
+                return
+
+            text = MOCK_QUESTIONS if "questions" in payload.get("prompt", "").lower() else MOCK_ANSWER
+            self._send_json(200, {
+                "model": payload.get("model"),
+                "response": text,
+                "done": True,
+                "total_duration": int(delay * 1e9),
+                "eval_count": len(text.split()),
+            })
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+
+# --- Main Script Logic ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a mock Ollama server with injected latency and errors.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency", type=float, default=0.2, help="Base response time in seconds.")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Random extra response time in seconds.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests failed with HTTP 500.")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Share of connections dropped.")
+    parser.add_argument("--capacity", type=int, default=None, help="Concurrent requests served at full speed.")
+    args = parser.parse_args()
+
+    server = MockOllamaServer(args.port, args.latency, args.jitter, args.error_rate, args.drop_rate, args.capacity)
+    print(f"Mock Ollama server listening on {server.api_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nMock Ollama server stopped.")
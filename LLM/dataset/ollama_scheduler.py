@@ -0,0 +1,288 @@
+import json
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# --- Configuration ---
+OLLAMA_API_URL = "http://localhost:11434/api/generate"
+
+# 1. Concurrency bounds. The scheduler starts at INITIAL_CONCURRENCY requests in
+#    flight and adapts between the bounds: +1 after each round of healthy
+#    responses, halved on errors, timeouts or a latency spike (AIMD).
+INITIAL_CONCURRENCY = 1
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 4
+
+# 2. A response counts as a latency spike when the rolling median time per
+#    generated token exceeds the best median seen so far for the same model by
+#    this factor. While the scheduler is down to MIN_CONCURRENCY the best median
+#    is re-learned instead: a server that is slow even then is not slow because
+#    of our load, and holding it to an old baseline would never let go.
+LATENCY_WINDOW = 20
+LATENCY_TOLERANCE = 2.0
+
+# 3. Retries per request, with exponential backoff starting at RETRY_BACKOFF_S.
+MAX_RETRIES = 3
+RETRY_BACKOFF_S = 2.0
+REQUEST_TIMEOUT_S = 300
+
+# 4. How long to wait for the server to come back when it stops answering.
+HEALTH_CHECK_INTERVAL_S = 5
+MAX_UNHEALTHY_WAIT_S = 300
+
+# Status codes Ollama (or a proxy in front of it) returns when it is overloaded
+# or restarting; anything else in the 4xx range is a bad request and not retried.
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class AdaptiveScheduler:
+    """
+    Client-side scheduler for an Ollama server: limits the number of requests
+    in flight, adapts that limit to how the server is coping, retries
+    transient failures and waits for the server to recover when it goes down.
+    Safe to share between threads.
+    """
+
+    def __init__(self, api_url=OLLAMA_API_URL, initial_concurrency=INITIAL_CONCURRENCY,
+                 min_concurrency=MIN_CONCURRENCY, max_concurrency=MAX_CONCURRENCY,
+                 max_retries=MAX_RETRIES, retry_backoff_s=RETRY_BACKOFF_S, timeout=REQUEST_TIMEOUT_S,
+                 latency_window=LATENCY_WINDOW, latency_tolerance=LATENCY_TOLERANCE,
+                 health_check_interval_s=HEALTH_CHECK_INTERVAL_S, max_unhealthy_wait_s=MAX_UNHEALTHY_WAIT_S):
+        self.api_url = api_url
+        self.base_url = api_url.split("/api/")[0]
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.retry_backoff_s = retry_backoff_s
+        self.timeout = timeout
+        self.latency_tolerance = latency_tolerance
+        self.health_check_interval_s = health_check_interval_s
+        self.max_unhealthy_wait_s = max_unhealthy_wait_s
+
+        self._limit = float(max(min_concurrency, min(initial_concurrency, max_concurrency)))
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._latencies = deque(maxlen=latency_window)       # seconds per request
+        self._latency_window = latency_window
+        self._token_latencies = {}  # model -> seconds per generated token
+        self._baselines = {}        # model -> best median seconds per token
+        self._last_decrease = 0.0
+
+        self.requests = 0
+        self.successes = 0
+        self.failures = 0
+        self.retries = 0
+        self.healthy = None
+
+    @property
+    def concurrency(self):
+        """The current limit on requests in flight."""
+        return int(self._limit)
+
+    def stats(self):
+        """A snapshot of the scheduler's counters and rolling latency."""
+        with self._condition:
+            latencies = sorted(self._latencies)
+            return {
+                "concurrency": self.concurrency,
+                "in_flight": self._in_flight,
+                "requests": self.requests,
+                "successes": self.successes,
+                "failures": self.failures,
+                "retries": self.retries,
+                "p50_latency_s": latencies[len(latencies) // 2] if latencies else None,
+                "p95_latency_s": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] if latencies else None,
+            }
+
+    def health_check(self):
+        """Probes the server. Returns True if it answers, and records the result."""
+        import requests
+
+        try:
+            response = requests.get(f"{self.base_url}/api/version", timeout=5)
+            self.healthy = response.ok
+        except requests.exceptions.RequestException:
+            self.healthy = False
+        return self.healthy
+
+    def wait_until_healthy(self):
+        """Blocks until the server answers a health check. Returns False on giving up."""
+        deadline = time.monotonic() + self.max_unhealthy_wait_s
+        while not self.health_check():
+            if time.monotonic() >= deadline:
+                return False
+            print(f"\nOllama server at {self.base_url} is not responding, "
+                  f"checking again in {self.health_check_interval_s}s...")
+            time.sleep(self.health_check_interval_s)
+        return True
+
+    def _acquire(self):
+        with self._condition:
+            while self._in_flight >= self.concurrency:
+                self._condition.wait()
+            self._in_flight += 1
+            self.requests += 1
+
+    def _release(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def _decrease(self):
+        # One overload episode usually fails every request in flight at once;
+        # only halve once per typical request duration so it is not counted
+        # several times over.
+        cooldown = statistics.median(self._latencies) if self._latencies else 1.0
+        now = time.monotonic()
+        if now - self._last_decrease < cooldown:
+            return
+        self._limit = max(float(self.min_concurrency), self._limit / 2)
+        self._last_decrease = now
+
+    def _on_success(self, model, latency, eval_count):
+        with self._condition:
+            self.successes += 1
+            self._latencies.append(latency)
+            # Normalising by the number of generated tokens keeps long answers
+            # from looking like an overloaded server, and tracking each model
+            # apart keeps a slower model from looking like one.
+            token_latencies = self._token_latencies.setdefault(model, deque(maxlen=self._latency_window))
+            token_latencies.append(latency / eval_count if eval_count else latency)
+            median = statistics.median(token_latencies)
+            baseline = self._baselines.get(model)
+            if len(token_latencies) >= min(5, token_latencies.maxlen):
+                if baseline is None or self._limit <= self.min_concurrency:
+                    baseline = median
+                else:
+                    baseline = min(baseline, median)
+                self._baselines[model] = baseline
+            if baseline is not None and median > baseline * self.latency_tolerance:
+                self._decrease()
+            else:
+                # Additive increase: +1 once as many requests as the current
+                # limit (about one round of in-flight requests) have succeeded.
+                self._limit = min(float(self.max_concurrency), self._limit + 1 / self._limit)
+            self._condition.notify_all()
+
+    def _on_overload(self):
+        with self._condition:
+            self._decrease()
+
+    def generate(self, payload):
+        """
+        Sends a request to the generate endpoint, retrying transient failures.
+        Returns the response JSON, or None once the retries are used up.
+        """
+        # Imported here rather than at the top so that scripts using this module
+        # start quickly when they do not send any requests (e.g. dry runs).
+        import requests
+
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                with self._condition:
+                    self.retries += 1
+                time.sleep(self.retry_backoff_s * 2 ** (attempt - 1))
+                if isinstance(last_error, requests.exceptions.ConnectionError) and not self.health_check():
+                    if not self.wait_until_healthy():
+                        break
+
+            self._acquire()
+            start = time.perf_counter()
+            try:
+                response = requests.post(self.api_url, json=payload, timeout=self.timeout)
+                if response.status_code in RETRYABLE_STATUS_CODES:
+                    self._on_overload()
+                    last_error = requests.exceptions.HTTPError(
+                        f"{response.status_code} {response.reason}", response=response)
+                    continue
+                response.raise_for_status()
+                response_json = response.json()
+            except requests.exceptions.HTTPError as e:
+                last_error = e
+                break  # A bad request will not succeed on a retry
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self._on_overload()
+                last_error = e
+                continue
+            except requests.exceptions.RequestException as e:
+                last_error = e
+                continue
+            finally:
+                self._release()
+
+            self._on_success(payload.get("model"), time.perf_counter() - start, response_json.get("eval_count"))
+            return response_json
+
+        with self._condition:
+            self.failures += 1
+        print(f"\nError querying model '{payload.get('model')}': {last_error}")
+        return None
+
+    def map_unordered(self, fn, items):
+        """
+        Calls fn(item) for every item from a pool of worker threads and yields
+        (item, result) pairs as they complete. The scheduler's concurrency
+        limit, not the pool size, decides how many requests are in flight.
+        """
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        try:
+            futures = {executor.submit(fn, item): item for item in items}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+class RetryQueue:
+    """
+    Failed work items persisted to a JSON file, so they are retried first on
+    the next run instead of being lost in the console output. Items are keyed
+    by a string and must be JSON-serialisable. Safe to share between threads.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._entries = {}
+        if os.path.exists(filename):
+            with open(filename, 'r', encoding='utf-8') as f:
+                try:
+                    self._entries = json.load(f)
+                except json.JSONDecodeError:
+                    print(f"Warning: Could not parse retry queue '{filename}'. Starting with an empty queue.")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def items(self):
+        """Returns the queued items, oldest first."""
+        with self._lock:
+            return [entry["item"] for entry in self._entries.values()]
+
+    def add(self, key, item, error=None):
+        """Queues (or re-queues) a failed item."""
+        with self._lock:
+            attempts = self._entries.get(key, {}).get("attempts", 0) + 1
+            self._entries[key] = {"item": item, "attempts": attempts, "error": error, "failed_at": time.time()}
+            self._save()
+
+    def remove(self, key):
+        """Drops an item once it has succeeded."""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._save()
+
+    def _save(self):
+        # Write to a temporary file and rename it, so a crash mid-write never
+        # leaves a truncated queue behind.
+        tmp_filename = f"{self.filename}.tmp"
+        with open(tmp_filename, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_filename, self.filename)
@@ -0,0 +1,398 @@
+import json
+import os
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from ollama_scheduler import AdaptiveScheduler
+
+# --- Configuration ---
+# 1. The local Ollama models that may act as the teacher.
+CANDIDATE_MODELS = [
+    "llama3.1",
+    "gpt-oss",
+    "deepseek-r1",
+]
+
+# 2. How many (situation, question) prompts to benchmark every model on. Half
+#    of them build the routing table, the other half evaluate the policies.
+CALIBRATION_SIZE = 40
+CALIBRATION_SEED = 7
+
+# 3. The minimum quality score (0 to 1) an answer needs to be accepted.
+QUALITY_FLOOR = 0.7
+
+# 4. Optional model used as a judge to score answers. When None, answers are
+#    scored with the heuristic in score_answer(), which needs no extra queries.
+JUDGE_MODEL = None
+
+# 5. Categories with fewer calibration prompts than this use the overall choice.
+MIN_PROMPTS_PER_CATEGORY = 3
+
+# 6. Output files: the routing table read by create_training_dataset.py and
+#    the per-policy cost/latency report.
+ROUTING_TABLE_FILE = "teacher_routing.json"
+REPORT_FILE = "teacher_routing_report.json"
+
+OLLAMA_API_URL = "http://localhost:11434/api/generate"
+
+JUDGE_PROMPT_TEMPLATE = """
+Rate the answer below to a question asked by someone in an offline emergency or everyday situation.
+Judge whether it is safe, factually correct, actionable and complete. Reply with a single integer from 1 (useless or dangerous) to 10 (excellent) and nothing else.
+
+{prompt}
+
+Answer:
+{answer}
+"""
+
+REFUSAL_PATTERN = re.compile(r"\b(i can(no|')t help|i'm sorry, but|i am unable to|as an ai)\b", re.IGNORECASE)
+STEP_PATTERN = re.compile(r'^\s*(\d+[\.\)]|[-*•])\s+', re.MULTILINE)
+SAFETY_PATTERN = re.compile(r'\b(emergency|professional|doctor|seek help|warning|caution|call \d+)\b', re.IGNORECASE)
+
+
+def timed_generate(model_name, prompt, system, scheduler):
+    """
+    Queries a model through the scheduler and measures it.
+    Returns a dict with the response, the wall-clock latency and the time the
+    server spent on the request (its cost), or None if the request failed.
+    Time spent loading the model into memory is reported separately as
+    load_s and left out of both the latency and the cost: it is paid once per
+    model switch, not per request.
+    """
+    payload = {
+        "model": model_name,
+        "prompt": prompt,
+        "stream": False,
+    }
+    if system:
+        payload["system"] = system
+
+    start = time.perf_counter()
+    response_json = scheduler.generate(payload)
+    if response_json is None:
+        return None
+    latency = time.perf_counter() - start
+
+    # Ollama reports durations in nanoseconds.
+    load = response_json.get("load_duration", 0) / 1e9
+    total = response_json.get("total_duration", latency * 1e9) / 1e9
+    return {
+        "model": model_name,
+        "response": response_json.get("response", "").strip(),
+        "latency_s": max(latency - load, 0.0),
+        "server_s": max(total - load, 0.0),
+        "load_s": load,
+    }
+
+
+def score_answer(answer):
+    """
+    Heuristic quality score between 0 and 1: rewards answers that are long
+    enough to be complete, structured as steps and mention safety, and rejects
+    refusals and leftover <think> reasoning.
+    """
+    if not answer or REFUSAL_PATTERN.search(answer[:300]):
+        return 0.0
+
+    words = len(answer.split())
+    score = 0.2
+    score += 0.35 * min(words, 150) / 150
+    if words > 1500:
+        score -= 0.1  # Rambling answers are hard to follow in an emergency
+    score += 0.25 * min(len(STEP_PATTERN.findall(answer)), 5) / 5
+    if SAFETY_PATTERN.search(answer):
+        score += 0.2
+    if "<think>" in answer:
+        score -= 0.3
+    return max(0.0, min(1.0, score))
+
+
+def judge_answer(judge_model, prompt, answer, scheduler):
+    """Asks the judge model to rate an answer. Returns a score between 0 and 1, or None."""
+    result = timed_generate(judge_model, JUDGE_PROMPT_TEMPLATE.format(prompt=prompt, answer=answer), None, scheduler)
+    if not result:
+        return None
+    match = re.search(r'\d+', result["response"])
+    if not match:
+        return None
+    return min(int(match.group()), 10) / 10
+
+
+def answer_quality(prompt, answer, scheduler, judge_model=None):
+    """Scores an answer with the judge model if one is configured, else heuristically."""
+    if judge_model and answer:
+        score = judge_answer(judge_model, prompt, answer, scheduler)
+        if score is not None:
+            return score
+    return score_answer(answer)
+
+
+def calibrate(models, prompts, system, scheduler, judge_model=None):
+    """
+    Runs every model on every calibration prompt.
+    `prompts` is a list of (prompt_id, category, prompt) tuples. Returns one
+    measurement dict per (prompt, model); failed requests have quality 0 and
+    no latency.
+
+    Models are benchmarked one after the other so that each stays loaded
+    while it is measured: a warm-up request loads it first, and its answers
+    are only judged once all of its prompts are done, as the judge model
+    could otherwise displace it.
+    """
+    measurements = []
+    for model in models:
+        print(f"  [{model}] Warming up")
+        timed_generate(model, prompts[0][2], system, scheduler)
+
+        results = []
+        for prompt_id, category, prompt in prompts:
+            print(f"  [{model}] Calibration prompt {prompt_id + 1}/{len(prompts)} ({category})")
+            results.append(timed_generate(model, prompt, system, scheduler))
+
+        for (prompt_id, category, prompt), result in zip(prompts, results):
+            measurement = {"prompt_id": prompt_id, "category": category, "model": model,
+                           "latency_s": None, "server_s": None, "quality": 0.0}
+            if result:
+                measurement["latency_s"] = result["latency_s"]
+                measurement["server_s"] = result["server_s"]
+                measurement["quality"] = answer_quality(prompt, result["response"], scheduler, judge_model)
+            measurements.append(measurement)
+    return measurements
+
+
+def _model_stats(measurements):
+    """Mean quality and mean cost per model (failures count as zero quality)."""
+    stats = {}
+    for m in measurements:
+        entry = stats.setdefault(m["model"], {"quality": [], "cost": []})
+        entry["quality"].append(m["quality"])
+        if m["server_s"] is not None:
+            entry["cost"].append(m["server_s"])
+    return {
+        model: {
+            "quality": sum(entry["quality"]) / len(entry["quality"]),
+            "cost": sum(entry["cost"]) / len(entry["cost"]) if entry["cost"] else float("inf"),
+        }
+        for model, entry in stats.items()
+    }
+
+
+def _rank_models(measurements, floor):
+    """
+    Orders models by preference: those whose mean quality meets the floor,
+    cheapest first, followed by the rest, best quality first.
+    """
+    stats = _model_stats(measurements)
+    eligible = sorted((m for m in stats if stats[m]["quality"] >= floor), key=lambda m: stats[m]["cost"])
+    others = sorted((m for m in stats if stats[m]["quality"] < floor), key=lambda m: -stats[m]["quality"])
+    return eligible + others, stats
+
+
+def build_routing_table(measurements, floor):
+    """
+    Picks, for every category and overall, the cheapest model whose mean
+    calibration quality meets the floor, plus the two models to hedge between.
+    """
+    ranked, stats = _rank_models(measurements, floor)
+    table = {
+        "quality_floor": floor,
+        "default": ranked[0],
+        "default_hedge": ranked[:2],
+        "categories": {},
+        "hedge": {},
+        "model_stats": stats,
+    }
+    by_category = {}
+    for m in measurements:
+        by_category.setdefault(m["category"], []).append(m)
+    for category, category_measurements in sorted(by_category.items()):
+        if len({m["prompt_id"] for m in category_measurements}) < MIN_PROMPTS_PER_CATEGORY:
+            continue
+        ranked, _ = _rank_models(category_measurements, floor)
+        table["categories"][category] = ranked[0]
+        table["hedge"][category] = ranked[:2]
+    return table
+
+
+def route_model(table, category):
+    """Returns the model the routing table picks for a category."""
+    return table["categories"].get(category, table["default"])
+
+
+def hedge_models(table, category):
+    """Returns the models the routing table hedges between for a category."""
+    return table["hedge"].get(category, table["default_hedge"])
+
+
+def load_routing_table(filename):
+    """Reads a routing table written by this script."""
+    with open(filename, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def hedged_generate(models, prompt, system, floor, scheduler, judge_model=None):
+    """
+    Sends the same prompt to several models at once and returns the first
+    answer that meets the quality floor, or the best answer if none does.
+    The returned dict is that of timed_generate() plus a "quality" key, or
+    None if every request failed. Slower requests cannot be cancelled: they
+    run to completion in the background (on the server too) and their answers
+    are discarded, so every hedged prompt costs all of its generations.
+    """
+    executor = ThreadPoolExecutor(max_workers=len(models))
+    futures = [executor.submit(timed_generate, model, prompt, system, scheduler) for model in models]
+    best = None
+    try:
+        for future in as_completed(futures):
+            result = future.result()
+            if not result:
+                continue
+            result["quality"] = answer_quality(prompt, result["response"], scheduler, judge_model)
+            if result["quality"] >= floor:
+                return result
+            if best is None or result["quality"] > best["quality"]:
+                best = result
+        return best
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _simulate_hedge(rows, floor):
+    """
+    Replays a hedged request from calibration measurements of the hedged models.
+    Returns (latency, cost, quality) or None if every model failed. The cost
+    is the full server time of every model, as hedged_generate() cannot stop
+    the requests it no longer needs. The latency is a lower bound: the models
+    were measured one at a time, while a hedged request makes them share the
+    server.
+    """
+    finished = sorted((r for r in rows if r["latency_s"] is not None), key=lambda r: r["latency_s"])
+    if not finished:
+        return None
+    cost = sum(r["server_s"] for r in finished)
+    for row in finished:
+        if row["quality"] >= floor:
+            return row["latency_s"], cost, row["quality"]
+    best = max(finished, key=lambda r: r["quality"])
+    return finished[-1]["latency_s"], cost, best["quality"]
+
+
+def evaluate_policies(measurements, table, models):
+    """
+    Replays each routing policy (every model on its own, routed, hedged) over
+    the measured prompts and summarises its cost, latency and quality.
+    """
+    floor = table["quality_floor"]
+    by_prompt = {}
+    for m in measurements:
+        by_prompt.setdefault(m["prompt_id"], {})[m["model"]] = m
+
+    outcomes = {f"static:{model}": [] for model in models}
+    outcomes["routed"] = []
+    outcomes["hedged"] = []
+    for rows in by_prompt.values():
+        category = next(iter(rows.values()))["category"]
+        for model in models:
+            row = rows[model]
+            outcomes[f"static:{model}"].append(
+                None if row["latency_s"] is None else (row["latency_s"], row["server_s"], row["quality"]))
+        row = rows[route_model(table, category)]
+        outcomes["routed"].append(None if row["latency_s"] is None else (row["latency_s"], row["server_s"], row["quality"]))
+        outcomes["hedged"].append(_simulate_hedge([rows[m] for m in hedge_models(table, category)], floor))
+
+    report = {}
+    for policy, results in outcomes.items():
+        done = [r for r in results if r is not None]
+        latencies = sorted(r[0] for r in done)
+        accepted = sum(1 for r in done if r[2] >= floor)
+        total_cost = sum(r[1] for r in done)
+        report[policy] = {
+            "prompts": len(results),
+            "failures": len(results) - len(done),
+            "acceptance_rate": accepted / len(results) if results else 0.0,
+            "mean_quality": sum(r[2] for r in done) / len(done) if done else 0.0,
+            "mean_latency_s": sum(latencies) / len(latencies) if latencies else None,
+            "p95_latency_s": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] if latencies else None,
+            "total_cost_s": total_cost,
+            "cost_per_accepted_s": total_cost / accepted if accepted else None,
+            # Replayed from requests measured alone; see _simulate_hedge().
+            "latency_is_lower_bound": policy == "hedged",
+        }
+    return report
+
+
+def print_report(report):
+    """Prints the per-policy report as a table."""
+    print(f"\n{'Policy':<22}{'Accepted':>10}{'Quality':>9}{'Mean lat.':>11}{'p95 lat.':>10}{'Cost':>10}{'Cost/acc.':>11}")
+    for policy, r in report.items():
+        bound = ">=" if r["latency_is_lower_bound"] else ""
+        mean_latency = f"{bound}{r['mean_latency_s']:.1f}s" if r["mean_latency_s"] is not None else "-"
+        p95_latency = f"{bound}{r['p95_latency_s']:.1f}s" if r["p95_latency_s"] is not None else "-"
+        cost_per_accepted = f"{r['cost_per_accepted_s']:.1f}s" if r["cost_per_accepted_s"] is not None else "-"
+        print(f"{policy:<22}{r['acceptance_rate']:>9.0%} {r['mean_quality']:>8.2f}{mean_latency:>11}"
+              f"{p95_latency:>10}{r['total_cost_s']:>9.1f}s{cost_per_accepted:>11}")
+    if any(r["latency_is_lower_bound"] for r in report.values()):
+        print(">= Lower bound: replayed from models measured one at a time, without the slowdown "
+              "of running them side by side.")
+
+
+# --- Main Script Logic ---
+def main():
+    """Benchmarks the candidate models and writes the routing table and report."""
+    from create_training_dataset import (
+        CATEGORIES_FILE,
+        QUESTION_FILES,
+        TEACHER_SYSTEM_PROMPT,
+        build_teacher_prompt,
+        consolidate_question_files,
+        load_categories,
+    )
+
+    print("--- Phase 1: Selecting calibration prompts ---")
+    consolidated_data = consolidate_question_files(QUESTION_FILES)
+    situation_categories, question_categories = {}, {}
+    if os.path.exists(CATEGORIES_FILE):
+        situation_categories, question_categories = load_categories(CATEGORIES_FILE)
+    else:
+        print(f"Note: '{CATEGORIES_FILE}' not found, routing will not be per category.")
+
+    pairs = sorted((s, q) for s, questions in consolidated_data.items() for q in questions if len(q.split()) >= 5)
+    if not pairs:
+        print("Error: No questions found to calibrate on.")
+        return
+    rng = random.Random(CALIBRATION_SEED)
+    sample = rng.sample(pairs, min(CALIBRATION_SIZE, len(pairs)))
+    prompts = [
+        (i, question_categories.get((s, q), situation_categories.get(s, "uncategorized")), build_teacher_prompt(s, q))
+        for i, (s, q) in enumerate(sample)
+    ]
+    print(f"Selected {len(prompts)} calibration prompts.")
+
+    print(f"\n--- Phase 2: Benchmarking {len(CANDIDATE_MODELS)} models ---")
+    # Calibration sends one request at a time so that the measured latencies
+    # are not inflated by the models competing with each other.
+    scheduler = AdaptiveScheduler(OLLAMA_API_URL, max_concurrency=1)
+    if not scheduler.wait_until_healthy():
+        print(f"Error: The Ollama server at {scheduler.base_url} is not responding.")
+        return
+    measurements = calibrate(CANDIDATE_MODELS, prompts, TEACHER_SYSTEM_PROMPT, scheduler, JUDGE_MODEL)
+
+    # Build the table on one half and evaluate it on the other, so the report
+    # is not flattered by routing decisions made on the same prompts.
+    split = max(len(prompts) // 2, 1)
+    table = build_routing_table([m for m in measurements if m["prompt_id"] < split], QUALITY_FLOOR)
+    report = evaluate_policies([m for m in measurements if m["prompt_id"] >= split], table, CANDIDATE_MODELS)
+    print_report(report)
+
+    with open(ROUTING_TABLE_FILE, 'w', encoding='utf-8') as f:
+        json.dump(table, f, indent=2)
+    with open(REPORT_FILE, 'w', encoding='utf-8') as f:
+        json.dump({"routing_table": table, "policies": report, "measurements": measurements}, f, indent=2)
+
+    print(f"\nRouting table saved to: {ROUTING_TABLE_FILE}")
+    print(f"Full report saved to: {REPORT_FILE}")
+
+if __name__ == "__main__":
+    main()
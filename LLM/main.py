@@ -1,6 +1,239 @@
-def main():
-    print("Hello from llm!")
+import argparse
+import importlib
+import json
+import os
+import sys
+
+from pipeline_config import DEFAULT_CONFIG_FILE, ConfigError, load_config
+
+LLM_DIR = os.path.dirname(os.path.abspath(__file__))
+
+OLLAMA_SETTINGS = {
+    "ollama.api_url": "OLLAMA_API_URL",
+    "ollama.max_concurrency": "MAX_CONCURRENCY",
+}
+
+BUILD_SETTINGS = {
+    "build.question_files": "QUESTION_FILES",
+    "build.questions_per_situation": "QUESTIONS_PER_SITUATION",
+    "build.random_seed": "RANDOM_SEED",
+    "build.teacher_model": "TEACHER_MODEL",
+    "build.output_file": "OUTPUT_JSONL_FILE",
+    "build.category_quotas": "CATEGORY_QUOTAS",
+    "build.categories_file": "CATEGORIES_FILE",
+    "build.routing_policy": "ROUTING_POLICY",
+    "build.routing_table_file": "ROUTING_TABLE_FILE",
+    "build.retry_queue_file": "RETRY_QUEUE_FILE",
+    **OLLAMA_SETTINGS,
+}
+
+# Each command runs the main() of one pipeline script. The scripts keep their
+# settings in module-level constants; before running, the command overwrites
+# them with the matching keys from the config file, as
+# {module: {"section.key": "CONSTANT"}}. Keys missing from the config file
+# leave the script's own default in place. Modules are only imported when
+# their command runs, so `--help` never loads torch or transformers.
+COMMANDS = {
+    "generate": {
+        "help": "Generate questions for every situation with the local Ollama models.",
+        "dir": "dataset",
+        "entry": ("generate_questions", "main"),
+        "dry_run": True,
+        "settings": {
+            "generate_questions": {
+                "generate.situations_file": "SITUATIONS_FILE",
+                "generate.models": "MODELS_TO_QUERY",
+                "generate.output_dir": "OUTPUT_DIR",
+                "generate.retry_queue_file": "RETRY_QUEUE_FILE",
+                **OLLAMA_SETTINGS,
+            },
+        },
+    },
+    "clean": {
+        "help": "Clean up a model's raw question file and renumber the questions.",
+        "dir": "dataset",
+        "dry_run": False,
+        # Each model's output needs its own cleaning script.
+        "sources": {
+            "llama": {
+                "entry": ("clean_llama", "process_llama_file"),
+                "settings": {
+                    "clean_llama": {
+                        "clean.llama_input_file": "INPUT_FILENAME",
+                        "clean.llama_output_file": "OUTPUT_FILENAME",
+                    },
+                },
+            },
+            "deepseek": {
+                "entry": ("clean_deepseek", "clean_and_process_file"),
+                "settings": {
+                    "clean_deepseek": {
+                        "clean.deepseek_input_file": "INPUT_FILENAME",
+                        "clean.deepseek_output_file": "OUTPUT_FILENAME",
+                    },
+                },
+            },
+        },
+    },
+    "classify": {
+        "help": "Label every situation and question with a category.",
+        "dir": "dataset",
+        "entry": ("classify_situations", "main"),
+        "dry_run": False,
+        "settings": {
+            "classify_situations": {
+                "classify.situations_file": "SITUATIONS_FILE",
+                "classify.question_files": "QUESTION_FILES",
+                "classify.output_file": "OUTPUT_JSONL_FILE",
+            },
+        },
+    },
+    "calibrate": {
+        "help": "Benchmark the teacher models and write the routing table.",
+        "dir": "dataset",
+        "entry": ("teacher_router", "main"),
+        "dry_run": False,
+        "settings": {
+            "teacher_router": {
+                "calibrate.candidate_models": "CANDIDATE_MODELS",
+                "calibrate.calibration_size": "CALIBRATION_SIZE",
+                "calibrate.quality_floor": "QUALITY_FLOOR",
+                "calibrate.judge_model": "JUDGE_MODEL",
+                "calibrate.routing_table_file": "ROUTING_TABLE_FILE",
+                "calibrate.report_file": "REPORT_FILE",
+                "ollama.api_url": "OLLAMA_API_URL",
+            },
+            # Calibration prompts come from the build's question files.
+            "create_training_dataset": BUILD_SETTINGS,
+        },
+    },
+    "build": {
+        "help": "Answer the sampled questions with the teacher model(s) to build the training dataset.",
+        "dir": "dataset",
+        "entry": ("create_training_dataset", "main"),
+        "dry_run": True,
+        "settings": {"create_training_dataset": BUILD_SETTINGS},
+    },
+    "train": {
+        "help": "Fine-tune the student model with LoRA on the teacher dataset.",
+        "dir": "scripts",
+        "entry": ("finetune_student", "main"),
+        "dry_run": True,
+        "profile": True,
+        "settings": {
+            "finetune_student": {
+                "train.student_model": "student_model_id",
+                "train.dataset_file": "dataset_file",
+                "train.output_dir": "output_dir",
+                "train.load_in_4bit": "load_in_4bit",
+                "train.bf16": "bf16",
+                "train.optim": "optim",
+                "train.num_train_epochs": "num_train_epochs",
+                "train.max_steps": "max_steps",
+                "train.per_device_train_batch_size": "per_device_train_batch_size",
+                "train.gradient_accumulation_steps": "gradient_accumulation_steps",
+                "train.learning_rate": "learning_rate",
+                "train.max_length": "max_length",
+                "train.lora_r": "lora_r",
+                "train.lora_alpha": "lora_alpha",
+                "train.lora_target_modules": "lora_target_modules",
+                "train.profile": "profile",
+                "train.profile_dir": "profile_dir",
+            },
+        },
+    },
+    "merge": {
+        "help": "Merge the trained LoRA adapters into the base model.",
+        "dir": "scripts",
+        "entry": ("merge_adapters", "main"),
+        "dry_run": True,
+        "profile": True,
+        "settings": {
+            "merge_adapters": {
+                "merge.base_model": "base_model_id",
+                "merge.adapter_path": "adapter_path",
+                "merge.merged_model_path": "merged_model_path",
+                "merge.profile": "profile",
+                "merge.profile_dir": "profile_dir",
+            },
+        },
+    },
+    "serve": {
+        "help": "Serve the merged student model over an Ollama-compatible API.",
+        "dir": "scripts",
+        "entry": ("serve_student", "main"),
+        "dry_run": True,
+        "settings": {
+            "serve_student": {
+                "serve.model_path": "model_path",
+                "serve.host": "host",
+                "serve.port": "port",
+                "serve.max_new_tokens": "max_new_tokens",
+            },
+        },
+    },
+}
+
+
+def build_parser():
+    """Builds the argument parser with one subcommand per pipeline step."""
+    parser = argparse.ArgumentParser(description="Offline assistant training pipeline.")
+    parser.add_argument("--config", default=DEFAULT_CONFIG_FILE,
+                        help="Pipeline config file (default: pipeline.toml next to this script).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("config", help="Validate the config file and print the resolved settings.")
+    for name, command in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=command["help"], description=command["help"])
+        if "sources" in command:
+            subparser.add_argument("source", choices=list(command["sources"]))
+        if command["dry_run"]:
+            subparser.add_argument("--dry-run", action="store_true",
+                                   help="Check the inputs and report what would be done, without doing it.")
+        if command.get("profile"):
+            subparser.add_argument("--profile", action="store_true",
+                                   help="Record memory and timings to a report and a trace (see training_profiler.py).")
+    return parser
+
+
+def run_command(name, config, dry_run=False, source=None, profile=False):
+    """Configures the command's script(s) from the config and runs it."""
+    command = COMMANDS[name]
+    if source is not None:
+        command = {**command, **command["sources"][source]}
+    script_dir = os.path.join(LLM_DIR, command["dir"])
+    if script_dir not in sys.path:
+        sys.path.insert(0, script_dir)
+
+    for module_name, settings in command["settings"].items():
+        module = importlib.import_module(module_name)
+        for key, attribute in settings.items():
+            section, option = key.split(".")
+            if option in config.get(section, {}):
+                setattr(module, attribute, config[section][option])
+
+    module_name, function_name = command["entry"]
+    module = importlib.import_module(module_name)
+    if profile:
+        module.profile = True
+    entry = getattr(module, function_name)
+    return entry(dry_run=True) if dry_run else entry()
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        config = load_config(args.config)
+    except ConfigError as e:
+        print(f"Error: {e}")
+        return 2
+
+    if args.command == "config":
+        print(json.dumps(config, indent=2))
+        return 0
+    run_command(args.command, config, getattr(args, "dry_run", False), getattr(args, "source", None),
+                getattr(args, "profile", False))
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
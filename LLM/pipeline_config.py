@@ -0,0 +1,198 @@
+import json
+import os
+import tomllib
+
+# --- Configuration ---
+DEFAULT_CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pipeline.toml")
+
+# The validated config is cached next to the config file, keyed by the config
+# file's location, size and modification time, so repeated runs skip parsing
+# and validation. Bump MANIFEST_VERSION whenever SCHEMA changes.
+MANIFEST_FILENAME = ".pipeline_manifest.json"
+MANIFEST_VERSION = 2
+
+# Every section and key the config file may contain, with its type. "path"
+# values (and lists of them, "paths") are resolved relative to the config file.
+# Keys left out of the config file keep the defaults set in the scripts.
+SCHEMA = {
+    "ollama": {
+        "api_url": str,
+        "max_concurrency": int,
+    },
+    "generate": {
+        "situations_file": "path",
+        "models": [str],
+        "output_dir": "path",
+        "retry_queue_file": "path",
+    },
+    "clean": {
+        "llama_input_file": "path",
+        "llama_output_file": "path",
+        "deepseek_input_file": "path",
+        "deepseek_output_file": "path",
+    },
+    "classify": {
+        "situations_file": "path",
+        "question_files": "paths",
+        "output_file": "path",
+    },
+    "build": {
+        "question_files": "paths",
+        "questions_per_situation": int,
+        "random_seed": int,
+        "teacher_model": str,
+        "output_file": "path",
+        "category_quotas": {str: int},
+        "categories_file": "path",
+        "routing_policy": str,
+        "routing_table_file": "path",
+        "retry_queue_file": "path",
+    },
+    "calibrate": {
+        "candidate_models": [str],
+        "calibration_size": int,
+        "quality_floor": float,
+        "judge_model": str,
+        "routing_table_file": "path",
+        "report_file": "path",
+    },
+    "train": {
+        "student_model": str,
+        "dataset_file": "path",
+        "output_dir": "path",
+        "load_in_4bit": bool,
+        "bf16": bool,
+        "optim": str,
+        "num_train_epochs": float,
+        "max_steps": int,
+        "per_device_train_batch_size": int,
+        "gradient_accumulation_steps": int,
+        "learning_rate": float,
+        "max_length": int,
+        "lora_r": int,
+        "lora_alpha": int,
+        "lora_target_modules": [str],
+        "profile": bool,
+        "profile_dir": "path",
+    },
+    "merge": {
+        "base_model": str,
+        "adapter_path": "path",
+        "merged_model_path": "path",
+        "profile": bool,
+        "profile_dir": "path",
+    },
+    "serve": {
+        "model_path": "path",
+        "host": str,
+        "port": int,
+        "max_new_tokens": int,
+    },
+}
+
+# Keys restricted to a fixed set of values.
+CHOICES = {
+    ("build", "routing_policy"): ("static", "routed", "hedged"),
+}
+
+
+class ConfigError(ValueError):
+    """Raised when the config file is missing or does not match SCHEMA."""
+
+
+def _type_name(expected):
+    if expected in ("path", "paths"):
+        return "a path" if expected == "path" else "a list of paths"
+    if isinstance(expected, list):
+        return f"a list of {expected[0].__name__}"
+    if isinstance(expected, dict):
+        key_type, value_type = next(iter(expected.items()))
+        return f"a table of {key_type.__name__} to {value_type.__name__}"
+    article = "an" if expected.__name__[0] in "aeiou" else "a"
+    return f"{article} {expected.__name__}"
+
+
+def _matches(value, expected):
+    if expected == "path":
+        return isinstance(value, str)
+    if expected == "paths":
+        return isinstance(value, list) and all(isinstance(v, str) for v in value)
+    if isinstance(expected, list):
+        return isinstance(value, list) and all(_matches(v, expected[0]) for v in value)
+    if isinstance(expected, dict):
+        key_type, value_type = next(iter(expected.items()))
+        return isinstance(value, dict) and all(
+            _matches(k, key_type) and _matches(v, value_type) for k, v in value.items())
+    if expected is float:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if expected is int:
+        return isinstance(value, int) and not isinstance(value, bool)
+    return isinstance(value, expected)
+
+
+def validate_config(raw_config, base_dir):
+    """
+    Checks a parsed config against SCHEMA and resolves its paths against
+    base_dir. Returns the validated config; raises ConfigError on the first
+    problem found.
+    """
+    config = {}
+    for section, values in raw_config.items():
+        if section not in SCHEMA:
+            raise ConfigError(f"Unknown section [{section}]. Expected one of: {', '.join(SCHEMA)}.")
+        if not isinstance(values, dict):
+            raise ConfigError(f"[{section}] must be a table.")
+        config[section] = {}
+        for key, value in values.items():
+            if key not in SCHEMA[section]:
+                raise ConfigError(f"Unknown key '{key}' in [{section}]. Expected one of: {', '.join(SCHEMA[section])}.")
+            expected = SCHEMA[section][key]
+            if not _matches(value, expected):
+                raise ConfigError(f"[{section}] {key} must be {_type_name(expected)}, got {value!r}.")
+            choices = CHOICES.get((section, key))
+            if choices and value not in choices:
+                raise ConfigError(f"[{section}] {key} must be one of {', '.join(choices)}, got {value!r}.")
+            if expected == "path":
+                value = os.path.normpath(os.path.join(base_dir, value))
+            elif expected == "paths":
+                value = [os.path.normpath(os.path.join(base_dir, v)) for v in value]
+            elif expected is float:
+                value = float(value)
+            config[section][key] = value
+    return config
+
+
+def load_config(filename=DEFAULT_CONFIG_FILE):
+    """
+    Loads and validates the pipeline config, reusing the cached manifest when
+    the config file has not changed since it was written.
+    """
+    filename = os.path.abspath(filename)
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        raise ConfigError(f"Config file '{filename}' was not found.") from None
+    key = [MANIFEST_VERSION, filename, stat.st_size, stat.st_mtime_ns]
+
+    manifest_file = os.path.join(os.path.dirname(filename), MANIFEST_FILENAME)
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get("key") == key:
+            return manifest["config"]
+    except (OSError, ValueError):
+        pass  # No usable manifest yet; fall through and build it
+
+    with open(filename, 'rb') as f:
+        try:
+            raw_config = tomllib.load(f)
+        except tomllib.TOMLDecodeError as e:
+            raise ConfigError(f"Could not parse '{filename}': {e}") from None
+    config = validate_config(raw_config, os.path.dirname(filename))
+
+    try:
+        with open(manifest_file, 'w', encoding='utf-8') as f:
+            json.dump({"key": key, "config": config}, f, indent=1)
+    except OSError:
+        pass  # A read-only checkout still works, just without the cache
+    return config
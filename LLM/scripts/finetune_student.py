@@ -1,57 +1,77 @@
-import torch
-from datasets import load_dataset
-from transformers import (
-    AutoModelForCausalLM,
-    AutoTokenizer,
-    BitsAndBytesConfig,
-)
-from peft import LoraConfig
-from trl import SFTTrainer, SFTConfig
+import json
 import os
 
+from training_profiler import Profiler, profile_trainer
+
+# The heavy libraries (torch, datasets, transformers, peft, trl) are imported
+# inside train() so that `--help` and dry runs start instantly.
+
 # --- Configuration ---
+# Paths below are relative to this script, so it can be run from anywhere.
+# `python main.py train` overrides these settings from pipeline.toml.
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
 # 1. The small, efficient model we will train (our "student").
 student_model_id = "microsoft/Phi-3-mini-4k-instruct"
 
-# 2. The instruction dataset we created in the previous step.
-dataset_file = "/home/dell-pc-03/Offline-Mobile-LLM/LLM/scripts/teacher_generated.jsonl"
+# 2. The instruction dataset we created in the previous step (.jsonl or .parquet).
+dataset_file = os.path.join(SCRIPTS_DIR, "teacher_generated.jsonl")
 
 # 3. The name for the output directory where our trained model adapters will be saved.
-output_dir = "/home/dell-pc-03/Offline-Mobile-LLM/LLM/scripts/phi3-mini-offline-assistant"
-
-# --- 1. Load the Dataset ---
-print(f"Loading dataset from {dataset_file}...")
-print(f"Loading dataset from {dataset_file}")
-dataset = load_dataset("json", data_files=dataset_file, split="train")
-print("Dataset loaded successfully.")
-
-# --- 2. Configure Quantization (for memory efficiency) ---
-# This configuration tells the model to load in 4-bit precision.
-bnb_config = BitsAndBytesConfig(
-    load_in_4bit=True,
-    bnb_4bit_quant_type="nf4",
-    bnb_4bit_compute_dtype=torch.bfloat16,
-    bnb_4bit_use_double_quant=False,
-)
-
-# --- 3. Load the tokenizer separately (needed for dataset preprocessing) ---
-print(f"Loading tokenizer: {student_model_id}")
-tokenizer = AutoTokenizer.from_pretrained(student_model_id, trust_remote_code=True)
-tokenizer.pad_token = tokenizer.eos_token
-tokenizer.padding_side = "right"
-print("Base model and tokenizer loaded.")
-
-# --- 4. Configure LoRA (the efficient training method) ---
-peft_config = LoraConfig(
-    lora_alpha=16,
-    lora_dropout=0.1,
-    r=64,
-    bias="none",
-    task_type="CAUSAL_LM",
-    target_modules=["qkv_proj", "o_proj", "gate_up_proj", "down_proj"]
-)
-
-# --- 5. Convert dataset to conversational format ---
+output_dir = os.path.join(SCRIPTS_DIR, "phi3-mini-offline-assistant")
+
+# 4. Memory settings. 4-bit loading, bf16 and the paged optimizer need a CUDA
+#    GPU; turn them off (optim = "adamw_torch") to train on CPU.
+load_in_4bit = True
+bf16 = True
+optim = "paged_adamw_32bit"
+
+# 5. Training length and batch size. max_steps > 0 overrides num_train_epochs.
+num_train_epochs = 1
+max_steps = -1
+per_device_train_batch_size = 2
+gradient_accumulation_steps = 4
+learning_rate = 2e-4
+max_length = 2048
+
+# 6. LoRA settings. The target modules are Phi-3's attention and MLP projections.
+lora_r = 64
+lora_alpha = 16
+lora_target_modules = ["qkv_proj", "o_proj", "gate_up_proj", "down_proj"]
+
+# 7. Profiling. When enabled, the memory and time of each phase and training
+#    step, the optimizer state size, data loader waits and per-layer
+#    forward/backward times are written to profile_dir (see training_profiler.py).
+profile = False
+profile_dir = os.path.join(SCRIPTS_DIR, "profiles")
+
+
+def check_dataset(filename):
+    """
+    Validates the dataset without loading any ML libraries: every record needs
+    a non-empty instruction and response. Returns (num_records, problems).
+    """
+    if filename.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        records = pq.read_table(filename, columns=["instruction", "response"]).to_pylist()
+    else:
+        records = []
+        with open(filename, 'r', encoding='utf-8') as f:
+            for line_num, line in enumerate(f, 1):
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    records.append({"_invalid": line_num})
+
+    problems = []
+    for i, record in enumerate(records, 1):
+        if "_invalid" in record:
+            problems.append(f"line {record['_invalid']}: invalid JSON")
+        elif not record.get("instruction") or not record.get("response"):
+            problems.append(f"record {i}: missing instruction or response")
+    return len(records), problems
+
+
 def convert_to_conversational(example):
     """Convert instruction-response pairs to conversational format"""
     return {
@@ -61,57 +81,127 @@ def convert_to_conversational(example):
         ]
     }
 
-# Apply conversion to dataset
-formatted_dataset = dataset.map(convert_to_conversational, remove_columns=dataset.column_names)
-
-# --- 6. Configure SFTConfig (replaces TrainingArguments) ---
-training_args = SFTConfig(
-    output_dir=output_dir,
-    num_train_epochs=1,
-    per_device_train_batch_size=2,
-    gradient_accumulation_steps=4,
-    optim="paged_adamw_32bit",
-    save_steps=100,
-    logging_steps=10,
-    learning_rate=2e-4,
-    weight_decay=0.001,
-    fp16=False,
-    bf16=True,
-    max_grad_norm=0.3,
-    max_steps=-1,
-    warmup_ratio=0.03,
-    group_by_length=True,
-    lr_scheduler_type="cosine",
-    # SFT-specific parameters
-    max_length=2048,
-    packing=False,
-    # Model initialization parameters
-    model_init_kwargs={
-        "quantization_config": bnb_config,
+
+def train(profiler):
+    """Fine-tunes the student model, recording each phase with the profiler."""
+    import torch
+    from datasets import load_dataset
+    from transformers import AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig
+    from peft import LoraConfig
+    from trl import SFTTrainer, SFTConfig
+
+    # --- 1. Load the Dataset ---
+    print(f"Loading dataset from {dataset_file}...")
+    with profiler.phase("dataset_load"):
+        dataset_format = "parquet" if dataset_file.endswith(".parquet") else "json"
+        dataset = load_dataset(dataset_format, data_files=dataset_file, split="train")
+    print("Dataset loaded successfully.")
+
+    # --- 2. Configure Quantization (for memory efficiency) ---
+    # When enabled, the model is loaded in 4-bit precision.
+    model_init_kwargs = {
         "device_map": "auto",
         "trust_remote_code": True,
         "use_cache": False,
+        "dtype": torch.float32,  # What SFTTrainer loads in unless told otherwise
     }
-)
-
-# --- 7. Create the Trainer ---
-trainer = SFTTrainer(
-    model=student_model_id,  # Pass model as string, not object
-    args=training_args,
-    train_dataset=formatted_dataset,
-    peft_config=peft_config,
-    processing_class=tokenizer,  # Use processing_class instead of tokenizer
-)
-
-# --- 8. Start Training ---
-print("Starting fine-tuning...")
-trainer.train()
-print("--- Fine-Tuning Complete ---")
-
-# --- 9. Save the Final Model Adapters ---
-final_model_path = os.path.join(output_dir, "final_checkpoint")
-trainer.save_model(final_model_path)
-print(f"Fine-tuned model adapters saved to: {final_model_path}")
-
-# Save the tokenizer as well
-trainer.processing_class.save_pretrained(final_model_path)
\ No newline at end of file
+    if load_in_4bit:
+        model_init_kwargs["quantization_config"] = BitsAndBytesConfig(
+            load_in_4bit=True,
+            bnb_4bit_quant_type="nf4",
+            bnb_4bit_compute_dtype=torch.bfloat16,
+            bnb_4bit_use_double_quant=False,
+        )
+
+    # --- 3. Load the Base Model and Tokenizer ---
+    # The model is loaded here rather than by SFTTrainer so that loading it
+    # and preparing the dataset show up as separate phases when profiling.
+    print(f"Loading base model and tokenizer: {student_model_id}")
+    with profiler.phase("model_load"):
+        tokenizer = AutoTokenizer.from_pretrained(student_model_id, trust_remote_code=True)
+        tokenizer.pad_token = tokenizer.eos_token
+        tokenizer.padding_side = "right"
+        model = AutoModelForCausalLM.from_pretrained(student_model_id, **model_init_kwargs)
+    print("Base model and tokenizer loaded.")
+
+    # --- 4. Configure LoRA (the efficient training method) ---
+    peft_config = LoraConfig(
+        lora_alpha=lora_alpha,
+        lora_dropout=0.1,
+        r=lora_r,
+        bias="none",
+        task_type="CAUSAL_LM",
+        target_modules=lora_target_modules,
+    )
+
+    # --- 5. Convert dataset to conversational format ---
+    with profiler.phase("dataset_map"):
+        formatted_dataset = dataset.map(convert_to_conversational, remove_columns=dataset.column_names)
+
+    # --- 6. Configure SFTConfig (replaces TrainingArguments) ---
+    training_args = SFTConfig(
+        output_dir=output_dir,
+        num_train_epochs=num_train_epochs,
+        per_device_train_batch_size=per_device_train_batch_size,
+        gradient_accumulation_steps=gradient_accumulation_steps,
+        optim=optim,
+        save_steps=100,
+        logging_steps=10,
+        learning_rate=learning_rate,
+        weight_decay=0.001,
+        fp16=False,
+        bf16=bf16,
+        max_grad_norm=0.3,
+        max_steps=max_steps,
+        warmup_ratio=0.03,
+        group_by_length=True,
+        lr_scheduler_type="cosine",
+        # SFT-specific parameters
+        max_length=max_length,
+        packing=False,
+    )
+
+    # --- 7. Create the Trainer ---
+    # SFTTrainer adds the LoRA adapters and tokenizes the dataset here.
+    with profiler.phase("trainer_setup"):
+        trainer = SFTTrainer(
+            model=model,
+            args=training_args,
+            train_dataset=formatted_dataset,
+            peft_config=peft_config,
+            processing_class=tokenizer,  # Use processing_class instead of tokenizer
+        )
+    profile_trainer(profiler, trainer)
+
+    # --- 8. Start Training ---
+    print("Starting fine-tuning...")
+    with profiler.phase("train"):
+        trainer.train()
+    print("--- Fine-Tuning Complete ---")
+
+    # --- 9. Save the Final Model Adapters ---
+    final_model_path = os.path.join(output_dir, "final_checkpoint")
+    with profiler.phase("save"):
+        trainer.save_model(final_model_path)
+        # Save the tokenizer as well
+        trainer.processing_class.save_pretrained(final_model_path)
+    print(f"Fine-tuned model adapters saved to: {final_model_path}")
+
+
+def main(dry_run=False):
+    """Fine-tunes the student model. With dry_run, only checks the dataset."""
+    if dry_run:
+        num_records, problems = check_dataset(dataset_file)
+        print(f"Dataset {dataset_file}: {num_records} records, {len(problems)} problems.")
+        for problem in problems[:20]:
+            print(f"  {problem}")
+        print(f"Dry run: would fine-tune {student_model_id} into {output_dir}.")
+        return
+
+    with Profiler(os.path.join(profile_dir, "train_report.json"),
+                  os.path.join(profile_dir, "train_trace.json"), enabled=profile) as profiler:
+        train(profiler)
+
+
+if __name__ == "__main__":
+    main()
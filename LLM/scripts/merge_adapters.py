@@ -1,49 +1,88 @@
-import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
-from peft import PeftModel
 import os
 
+from training_profiler import Profiler
+
+# torch, transformers and peft are imported inside merge() so that `--help`
+# and dry runs start instantly.
+
 # --- Configuration ---
+# Paths below are relative to this script, so it can be run from anywhere.
+# `python main.py merge` overrides these settings from pipeline.toml.
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
 # 1. The base model ID (the same one we used for training).
 base_model_id = "microsoft/Phi-3-mini-4k-instruct"
 
 # 2. The path to your trained LoRA adapters.
 #    This should point to the 'final_checkpoint' directory created by the training script.
-adapter_path = "./phi3-mini-offline-assistant/final_checkpoint"
+adapter_path = os.path.join(SCRIPTS_DIR, "phi3-mini-offline-assistant", "final_checkpoint")
 
 # 3. The directory where we will save the merged model.
-merged_model_path = "./phi3-mini-offline-assistant/merged_model"
-
-# --- 1. Load the Tokenizer ---
-print(f"Loading tokenizer from {base_model_id}...")
-tokenizer = AutoTokenizer.from_pretrained(base_model_id)
-
-# --- 2. Load the Base Model ---
-print(f"Loading the base model ({base_model_id})...")
-base_model = AutoModelForCausalLM.from_pretrained(
-    base_model_id,
-    torch_dtype=torch.bfloat16, # Use the same dtype as training
-    device_map="auto",
-    trust_remote_code=True,
-)
-
-# --- 3. Load the PEFT Model (Base Model + Adapters) ---
-print(f"Loading PEFT model and applying adapters from {adapter_path}...")
-# This loads the base model and attaches the adapters to it
-model = PeftModel.from_pretrained(base_model, adapter_path)
-
-# --- 4. Merge the Adapters into the Model ---
-print("Merging the LoRA adapters into the base model...")
-# This operation creates a new, standard model by combining the weights
-model = model.merge_and_unload()
-print("Merging complete.")
-
-# --- 5. Save the Merged Model and Tokenizer ---
-print(f"Saving the merged model to {merged_model_path}...")
-os.makedirs(merged_model_path, exist_ok=True)
-model.save_pretrained(merged_model_path)
-tokenizer.save_pretrained(merged_model_path)
-
-print("\n--- Merging Process Finished ---")
-print(f"Your fully fine-tuned model has been saved to: {merged_model_path}")
-print("Next step is to convert this model to GGUF format.")
\ No newline at end of file
+merged_model_path = os.path.join(SCRIPTS_DIR, "phi3-mini-offline-assistant", "merged_model")
+
+# 4. Profiling. When enabled, the time and memory of loading, merging and
+#    saving are written to profile_dir (see training_profiler.py).
+profile = False
+profile_dir = os.path.join(SCRIPTS_DIR, "profiles")
+
+
+def merge(profiler):
+    """Merges the LoRA adapters into the base model, recording each phase with the profiler."""
+    import torch
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+    from peft import PeftModel
+
+    # --- 1. Load the Tokenizer ---
+    print(f"Loading tokenizer from {base_model_id}...")
+    with profiler.phase("model_load"):
+        tokenizer = AutoTokenizer.from_pretrained(base_model_id)
+
+        # --- 2. Load the Base Model ---
+        print(f"Loading the base model ({base_model_id})...")
+        base_model = AutoModelForCausalLM.from_pretrained(
+            base_model_id,
+            torch_dtype=torch.bfloat16, # Use the same dtype as training
+            device_map="auto",
+            trust_remote_code=True,
+        )
+
+    # --- 3. Load the PEFT Model (Base Model + Adapters) ---
+    print(f"Loading PEFT model and applying adapters from {adapter_path}...")
+    # This loads the base model and attaches the adapters to it
+    with profiler.phase("adapter_load"):
+        model = PeftModel.from_pretrained(base_model, adapter_path)
+
+    # --- 4. Merge the Adapters into the Model ---
+    print("Merging the LoRA adapters into the base model...")
+    # This operation creates a new, standard model by combining the weights
+    with profiler.phase("merge"):
+        model = model.merge_and_unload()
+    print("Merging complete.")
+
+    # --- 5. Save the Merged Model and Tokenizer ---
+    print(f"Saving the merged model to {merged_model_path}...")
+    with profiler.phase("save"):
+        os.makedirs(merged_model_path, exist_ok=True)
+        model.save_pretrained(merged_model_path)
+        tokenizer.save_pretrained(merged_model_path)
+
+    print("\n--- Merging Process Finished ---")
+    print(f"Your fully fine-tuned model has been saved to: {merged_model_path}")
+    print("Next step is to convert this model to GGUF format.")
+
+
+def main(dry_run=False):
+    """Merges the LoRA adapters into the base model. With dry_run, only checks the inputs."""
+    if dry_run:
+        found = os.path.exists(os.path.join(adapter_path, "adapter_config.json"))
+        print(f"Adapters {adapter_path}: {'found' if found else 'NOT FOUND'}.")
+        print(f"Dry run: would merge them into {base_model_id} and save to {merged_model_path}.")
+        return
+
+    with Profiler(os.path.join(profile_dir, "merge_report.json"),
+                  os.path.join(profile_dir, "merge_trace.json"), enabled=profile) as profiler:
+        merge(profiler)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# torch and transformers are imported when the model is loaded so that
+# `--help` and dry runs start instantly.
+
+# --- Configuration ---
+# Serves the merged student model over the same /api/generate endpoint as
+# Ollama, so the dataset scripts (e.g. teacher_router.py) can query it like any
+# other model before it is converted to GGUF.
+# `python main.py serve` overrides these settings from pipeline.toml.
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 1. The merged model written by merge_adapters.py.
+model_path = os.path.join(SCRIPTS_DIR, "phi3-mini-offline-assistant", "merged_model")
+
+# 2. Where to listen. The default port avoids clashing with a local Ollama.
+host = "127.0.0.1"
+port = 8000
+
+# 3. The maximum length of each answer, in tokens.
+max_new_tokens = 512
+
+
+def load_model(path):
+    """Loads the merged model and its tokenizer."""
+    import torch
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(path)
+    model = AutoModelForCausalLM.from_pretrained(
+        path,
+        torch_dtype=torch.bfloat16 if torch.cuda.is_available() else torch.float32,
+        device_map="auto",
+    )
+    model.eval()
+    return model, tokenizer
+
+
+def generate_response(model, tokenizer, prompt, system=None):
+    """Answers a prompt with the student model. Returns (text, number of generated tokens)."""
+    import torch
+
+    messages = [{"role": "user", "content": prompt}]
+    if system:
+        messages.insert(0, {"role": "system", "content": system})
+    input_ids = tokenizer.apply_chat_template(messages, add_generation_prompt=True, return_tensors="pt").to(model.device)
+    with torch.no_grad():
+        output_ids = model.generate(input_ids, max_new_tokens=max_new_tokens, do_sample=False)
+    new_tokens = output_ids[0][input_ids.shape[-1]:]
+    return tokenizer.decode(new_tokens, skip_special_tokens=True).strip(), len(new_tokens)
+
+
+class StudentHandler(BaseHTTPRequestHandler):
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/api/version":
+            self._send_json(200, {"version": "student"})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path != "/api/generate":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            payload = json.loads(body)
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": "invalid JSON"})
+            return
+
+        server = self.server
+        start = time.perf_counter()
+        # One generation at a time: the model is not safe to share between threads.
+        with server.lock:
+            text, eval_count = generate_response(server.model, server.tokenizer,
+                                                 payload.get("prompt", ""), payload.get("system"))
+        self._send_json(200, {
+            "model": payload.get("model"),
+            "response": text,
+            "done": True,
+            "total_duration": int((time.perf_counter() - start) * 1e9),
+            "eval_count": eval_count,
+        })
+
+
+def main(dry_run=False):
+    """Serves the merged student model. With dry_run, only checks that it exists."""
+    if dry_run:
+        found = os.path.exists(os.path.join(model_path, "config.json"))
+        print(f"Model {model_path}: {'found' if found else 'NOT FOUND'}.")
+        print(f"Dry run: would serve it at http://{host}:{port}/api/generate.")
+        return
+
+    print(f"Loading the student model from {model_path}...")
+    server = ThreadingHTTPServer((host, port), StudentHandler)
+    server.model, server.tokenizer = load_model(model_path)
+    server.lock = threading.Lock()
+    print(f"Serving the student model at http://{host}:{port}/api/generate (Ctrl+C to stop).")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
+
+
+if __name__ == "__main__":
+    main()
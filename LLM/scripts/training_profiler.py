@@ -0,0 +1,452 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# torch and transformers are only touched by the hooks below, once the
+# training or merge script has imported them, so the profiler itself adds
+# nothing to startup.
+
+# --- Configuration ---
+# Opt-in profiling for finetune_student.py and merge_adapters.py, switched on
+# with their `profile` setting (or `python main.py train --profile`). A run
+# writes a JSON report and a trace in the Chrome trace format, which opens in
+# https://ui.perfetto.dev or chrome://tracing.
+
+# 1. How often a background thread samples the memory of the process. The peak
+#    of a phase is the highest sample taken while it ran.
+SAMPLE_INTERVAL_S = 0.02
+
+# 2. How often one of those samples is also written to the trace as a counter.
+TRACE_COUNTER_INTERVAL_S = 0.5
+
+# 3. Per-layer forward/backward times go into the trace for the first
+#    TRACE_LAYER_STEPS training steps only, to keep the trace small. The
+#    report adds them up over every step.
+TRACE_LAYER_STEPS = 3
+
+# Rows of the trace, shown as threads by the trace viewers.
+TRACE_ROWS = {1: "phases", 2: "data loader", 3: "layers"}
+PHASES_ROW, DATA_ROW, LAYERS_ROW = TRACE_ROWS
+
+
+def current_rss_bytes():
+    """The resident memory of this process, or None where /proc is not available."""
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss_bytes():
+    """The highest resident memory of this process so far, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux reports KiB
+
+
+def _cuda():
+    """
+    torch.cuda if the script has imported torch and a GPU is available, else
+    None. Only call it from the main thread: another thread could catch torch
+    halfway through being imported.
+    """
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        return torch.cuda
+    return None
+
+
+def _mib(num_bytes):
+    return None if num_bytes is None else round(num_bytes / 2**20, 1)
+
+
+def _format_mib(num_bytes):
+    return "-" if num_bytes is None else f"{num_bytes / 2**20:.0f} MiB"
+
+
+class Profiler:
+    """
+    Records how long each phase of a run takes and how much memory it uses,
+    plus whatever profile_trainer() adds, and writes it all to a JSON report
+    and a trace. Use it as a context manager: the files are written on the way
+    out even when the run crashes, which is when they are needed most.
+    With enabled=False every method does nothing, so scripts can call it
+    unconditionally.
+    """
+
+    def __init__(self, report_file, trace_file, enabled=True,
+                 sample_interval_s=SAMPLE_INTERVAL_S, trace_counter_interval_s=TRACE_COUNTER_INTERVAL_S):
+        self.report_file = report_file
+        self.trace_file = trace_file
+        self.enabled = enabled
+        self.sample_interval_s = sample_interval_s
+        self.trace_counter_interval_s = trace_counter_interval_s
+
+        self.report = {"phases": [], "steps": []}
+        self.events = []
+        self._open = []  # Phases that have begun but not ended, outermost first
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample_memory, daemon=True)
+        self._start = time.perf_counter()
+        self._cuda_peak = None
+        self._sampled_cuda = None  # torch.cuda for the sampler thread, once the main thread has seen it
+
+    def __enter__(self):
+        if self.enabled:
+            self._start = time.perf_counter()
+            self._sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.enabled:
+            return False
+        while self._open:
+            self.end(self._open[-1])
+        if exc_type is not None:
+            self.report["error"] = f"{exc_type.__name__}: {exc}"
+        self._stop.set()
+        self._sampler.join()
+        self.save()
+        self.print_summary()
+        return False
+
+    def _ts(self, perf_time):
+        """A perf_counter() time as trace microseconds since the profiler started."""
+        return round((perf_time - self._start) * 1e6, 1)
+
+    def _sample_memory(self):
+        last_counter = 0.0
+        while not self._stop.wait(self.sample_interval_s):
+            rss = current_rss_bytes()
+            if rss is None:
+                return
+            with self._lock:
+                for record in self._open:
+                    record["rss_peak_bytes"] = max(record["rss_peak_bytes"], rss)
+            now = time.perf_counter()
+            if now - last_counter >= self.trace_counter_interval_s:
+                last_counter = now
+                self._add_counter(now, rss)
+
+    def _add_counter(self, perf_time, rss):
+        values = {"rss_mib": _mib(rss)}
+        cuda = self._sampled_cuda
+        if cuda is not None:
+            values["cuda_allocated_mib"] = _mib(sum(cuda.memory_allocated(d) for d in range(cuda.device_count())))
+        self.events.append({"name": "memory", "ph": "C", "ts": self._ts(perf_time), "pid": os.getpid(),
+                            "args": values})
+
+    def _read_cuda(self):
+        """
+        Returns the GPU memory allocated right now, after crediting the peak
+        since the last reading to every open phase. The peak counter is then
+        reset, so nested phases (e.g. steps within training) each get their own.
+        """
+        cuda = self._sampled_cuda = _cuda()
+        if cuda is None:
+            return None
+        devices = range(cuda.device_count())
+        peak = sum(cuda.max_memory_allocated(d) for d in devices)
+        with self._lock:
+            for record in self._open:
+                record["cuda_peak_bytes"] = max(record["cuda_peak_bytes"] or 0, peak)
+        self._cuda_peak = max(self._cuda_peak or 0, peak)
+        for d in devices:
+            cuda.reset_peak_memory_stats(d)
+        return sum(cuda.memory_allocated(d) for d in devices)
+
+    def begin(self, name, **args):
+        """Starts a phase and returns its record; pass it to end()."""
+        if not self.enabled:
+            return None
+        cuda_bytes = self._read_cuda()
+        rss = current_rss_bytes()
+        start = time.perf_counter()
+        record = {
+            "name": name,
+            **args,
+            "start_s": round(start - self._start, 6),
+            "rss_start_bytes": rss,
+            "rss_peak_bytes": rss,
+            "cuda_start_bytes": cuda_bytes,
+            "cuda_peak_bytes": cuda_bytes,
+            "_start": start,
+        }
+        with self._lock:
+            self._open.append(record)
+        return record
+
+    def end(self, record):
+        """Ends a phase started with begin(), fills in its record and returns it."""
+        if record is None:
+            return None
+        cuda_bytes = self._read_cuda()
+        rss = current_rss_bytes()
+        end = time.perf_counter()
+        with self._lock:
+            self._open = [r for r in self._open if r is not record]
+        start = record.pop("_start")
+        record["duration_s"] = round(end - start, 6)
+        record["rss_end_bytes"] = rss
+        if rss is not None:
+            record["rss_peak_bytes"] = max(record["rss_peak_bytes"], rss)
+        record["cuda_end_bytes"] = cuda_bytes
+        self.complete(record["name"], start, end, row=PHASES_ROW, args={
+            key: _mib(value) if key.endswith("_bytes") else value
+            for key, value in record.items() if key != "name"
+        })
+        if rss is not None:
+            self._add_counter(end, rss)
+        return record
+
+    @contextmanager
+    def phase(self, name, **args):
+        """Records the enclosed block as one phase of the report."""
+        record = self.begin(name, **args)
+        try:
+            yield record
+        finally:
+            if record is not None:
+                self.report["phases"].append(self.end(record))
+
+    def complete(self, name, start, end, row, args=None):
+        """Adds a finished event, timed with time.perf_counter(), to the trace."""
+        if not self.enabled:
+            return
+        event = {"name": name, "ph": "X", "ts": self._ts(start), "dur": round((end - start) * 1e6, 1),
+                 "pid": os.getpid(), "tid": row}
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    def save(self):
+        """Writes the report and the trace."""
+        self.report["duration_s"] = round(time.perf_counter() - self._start, 3)
+        self.report["peak_rss_bytes"] = peak_rss_bytes()
+        self.report["peak_cuda_bytes"] = self._cuda_peak
+        steps = self.report["steps"]
+        if steps:
+            compute_s = sum(step["duration_s"] for step in steps)
+            wait_s = sum(step["data_wait_s"] for step in steps)
+            self.report["step_summary"] = {
+                "steps": len(steps),
+                "mean_step_s": round(compute_s / len(steps), 6),
+                "mean_data_wait_s": round(wait_s / len(steps), 6),
+                "data_wait_fraction": round(wait_s / (compute_s + wait_s), 4) if compute_s + wait_s else 0.0,
+                "max_step_rss_peak_bytes": max((s["rss_peak_bytes"] or 0) for s in steps) or None,
+                "max_step_cuda_peak_bytes": max((s["cuda_peak_bytes"] or 0) for s in steps) or None,
+            }
+
+        for filename in (self.report_file, self.trace_file):
+            os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        with open(self.report_file, 'w', encoding='utf-8') as f:
+            json.dump(self.report, f, indent=2)
+
+        metadata = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": row, "args": {"name": label}}
+                    for row, label in TRACE_ROWS.items()]
+        with open(self.trace_file, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": metadata + self.events, "displayTimeUnit": "ms"}, f)
+
+    def print_summary(self):
+        """Prints the main numbers of the report."""
+        report = self.report
+        print("\n--- Profile ---")
+        if "error" in report:
+            print(f"The run failed: {report['error']}")
+        print(f"{'Phase':<16}{'Time':>10}{'RSS peak':>14}{'GPU peak':>14}")
+        for phase in report["phases"]:
+            print(f"{phase['name']:<16}{phase['duration_s']:>9.2f}s"
+                  f"{_format_mib(phase['rss_peak_bytes']):>14}{_format_mib(phase['cuda_peak_bytes']):>14}")
+        print(f"Process peak RSS: {_format_mib(report['peak_rss_bytes'])}, "
+              f"GPU peak: {_format_mib(report['peak_cuda_bytes'])}")
+
+        if "step_summary" in report:
+            summary = report["step_summary"]
+            print(f"{summary['steps']} steps: {summary['mean_step_s'] * 1000:.1f} ms per step, "
+                  f"{summary['mean_data_wait_s'] * 1000:.1f} ms waiting for data "
+                  f"({summary['data_wait_fraction']:.1%} of training time).")
+        if "optimizer_state_bytes" in report:
+            print(f"Optimizer state: {_mib(report['optimizer_state_bytes'])} MiB for "
+                  f"{report['trainable_parameters']:,} trainable parameters.")
+        if report.get("layers"):
+            slowest = sorted(report["layers"].items(),
+                             key=lambda item: item[1]["forward_s"] + item[1]["backward_s"], reverse=True)
+            print("Slowest layers (forward / backward, ms per call):")
+            for name, layer in slowest[:5]:
+                forward = layer["forward_s"] / layer["forward_calls"] * 1000 if layer["forward_calls"] else 0.0
+                backward = layer["backward_s"] / layer["backward_calls"] * 1000 if layer["backward_calls"] else 0.0
+                print(f"  {name:<40}{forward:>8.2f} /{backward:>8.2f}")
+        print(f"Report saved to {self.report_file}")
+        print(f"Trace saved to {self.trace_file} (open it in https://ui.perfetto.dev)")
+
+
+class LayerTimer:
+    """
+    Times the forward and backward pass of each layer of a model, where the
+    layers are the modules held in its top-level nn.ModuleLists (the
+    transformer blocks). With gradient checkpointing the forward pass of a
+    block is re-run inside its backward pass, so it is counted twice. On a GPU
+    every hook waits for the device to finish, which slows training down.
+    """
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.trace = True
+        self.layers = {}
+        self._starts = {}
+        self._handles = []
+        self._sync = None
+
+    def attach(self, model):
+        import torch
+
+        prefixes = []
+        for name, module in model.named_modules():
+            if not isinstance(module, torch.nn.ModuleList) or any(name.startswith(p) for p in prefixes):
+                continue
+            for index, layer in enumerate(module):
+                layer_name = f"{name}.{index}"
+                prefixes.append(layer_name + ".")
+                self._handles += [
+                    layer.register_forward_pre_hook(self._start_hook(layer_name, "forward")),
+                    layer.register_forward_hook(self._end_hook(layer_name, "forward")),
+                    layer.register_full_backward_pre_hook(self._start_hook(layer_name, "backward")),
+                    layer.register_full_backward_hook(self._end_hook(layer_name, "backward")),
+                ]
+        if any(p.is_cuda for p in model.parameters()):
+            self._sync = torch.cuda.synchronize
+
+    def detach(self):
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+
+    def _start_hook(self, name, direction):
+        def hook(*_):
+            if self._sync:
+                self._sync()
+            self._starts.setdefault((name, direction), []).append(time.perf_counter())
+        return hook
+
+    def _end_hook(self, name, direction):
+        def hook(*_):
+            starts = self._starts.get((name, direction))
+            if not starts:
+                return
+            if self._sync:
+                self._sync()
+            end = time.perf_counter()
+            start = starts.pop()
+            layer = self.layers.setdefault(name, {"forward_s": 0.0, "forward_calls": 0,
+                                                  "backward_s": 0.0, "backward_calls": 0})
+            layer[f"{direction}_s"] += end - start
+            layer[f"{direction}_calls"] += 1
+            if self.trace:
+                self.profiler.complete(f"{name} {direction}", start, end, row=LAYERS_ROW)
+        return hook
+
+
+class TimedDataLoader:
+    """Wraps a data loader and reports how long the training loop waits for each batch."""
+
+    def __init__(self, dataloader, profiler, on_wait):
+        self.dataloader = dataloader
+        self.profiler = profiler
+        self.on_wait = on_wait
+
+    def __len__(self):
+        return len(self.dataloader)
+
+    def __getattr__(self, name):
+        return getattr(self.dataloader, name)
+
+    def __iter__(self):
+        iterator = iter(self.dataloader)
+        while True:
+            start = time.perf_counter()
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                return
+            end = time.perf_counter()
+            self.profiler.complete("dataloader wait", start, end, row=DATA_ROW)
+            self.on_wait(end - start)
+            yield batch
+
+
+def optimizer_state_bytes(optimizer):
+    """The memory held by the optimizer's state (e.g. Adam's moment estimates), in bytes."""
+    import torch
+
+    optimizer = getattr(optimizer, "optimizer", optimizer)  # Unwrap accelerate's AcceleratedOptimizer
+    total = 0
+    for state in optimizer.state.values():
+        for value in state.values():
+            if torch.is_tensor(value):
+                total += value.numel() * value.element_size()
+    return total
+
+
+def profile_trainer(profiler, trainer):
+    """
+    Hooks the profiler into a transformers Trainer. Every optimizer step is
+    recorded as a step (time, memory, and the time spent waiting for its
+    batches), the optimizer state is measured after the first step and every
+    layer's forward and backward pass is timed.
+    """
+    if not profiler.enabled:
+        return
+    from transformers import TrainerCallback
+
+    layer_timer = LayerTimer(profiler)
+
+    class ProfilerCallback(TrainerCallback):
+        def __init__(self):
+            self.step = None
+            self.data_wait_s = 0.0
+
+        def add_data_wait(self, seconds):
+            self.data_wait_s += seconds
+
+        def on_train_begin(self, args, state, control, model=None, **kwargs):
+            trainable = [p for p in model.parameters() if p.requires_grad]
+            profiler.report["trainable_parameters"] = sum(p.numel() for p in trainable)
+            profiler.report["trainable_parameter_bytes"] = sum(p.numel() * p.element_size() for p in trainable)
+            layer_timer.attach(model)
+
+        def on_step_begin(self, args, state, control, **kwargs):
+            layer_timer.trace = state.global_step < TRACE_LAYER_STEPS
+            self.step = profiler.begin("train_step", step=state.global_step + 1)
+
+        def on_step_end(self, args, state, control, optimizer=None, **kwargs):
+            record = profiler.end(self.step)
+            record["data_wait_s"] = round(self.data_wait_s, 6)
+            self.data_wait_s = 0.0
+            profiler.report["steps"].append(record)
+            if "optimizer_state_bytes" not in profiler.report and optimizer is not None:
+                profiler.report["optimizer_state_bytes"] = optimizer_state_bytes(optimizer)
+
+        def on_train_end(self, args, state, control, **kwargs):
+            layer_timer.detach()
+
+    callback = ProfilerCallback()
+    trainer.add_callback(callback)
+    # The layer times are kept in one dict that the report shares, so they are
+    # saved even if training stops partway through.
+    profiler.report["layers"] = layer_timer.layers
+
+    # The training loop fetches the batches for each step before the step
+    # begins, so the data loader itself is wrapped to time the waits.
+    get_train_dataloader = trainer.get_train_dataloader
+    trainer.get_train_dataloader = lambda: TimedDataLoader(get_train_dataloader(), profiler, callback.add_data_wait)